@@ -1,122 +1,97 @@
+import uuid
 import pandas as pd
-from PIL import Image, UnidentifiedImageError
-import torch
-from torchvision import transforms
-from transformers import BlipProcessor, BlipForConditionalGeneration, CLIPProcessor, CLIPModel
-import spacy
-import spacy.cli
-import re
+from PIL import UnidentifiedImageError
 import streamlit as st
-
-# Cached model loaders for Streamlit performance
-@st.cache_resource
-def load_blip_model():
-    processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")
-    model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large")
-    model.eval()
-    return processor, model
-
+import instrumentation
+from utils import load_uploaded_images, clear_temp_images, prune_workspaces
+from caption_engine import DEFAULT_BATCH_SIZE
+from attribute_extractor import enrich_attributes_from_images
+from model_registry import get_blip, get_clip
+from inference_profiles import PROFILES, DEFAULT_PROFILE
+
+# Cached model loaders for Streamlit performance; the registry loads each model
+# on first call, so a session only pays for the mode it uses
 @st.cache_resource
-def load_clip_model():
-    processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-    model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-    model.eval()
-    return processor, model
+def load_blip_model(profile=None):
+    return get_blip(profile)
 
 @st.cache_resource
-def load_spacy_model():
-    try:
-        return spacy.load("en_core_web_sm")
-    except OSError:
-        spacy.cli.download("en_core_web_sm")
-        return spacy.load("en_core_web_sm")
-
-# Load models
-processor_blip, model_blip = load_blip_model()
-clip_processor, clip_model = load_clip_model()
-nlp = load_spacy_model()
-
-categories = ['Color', 'Material', 'Style', 'SleeveType', 'Neckline', 'Pattern']
-
-attribute_keywords = {
-    'Color': ["red", "blue", "green", "yellow", "black", "white", "pink", "purple", "orange", "beige", "brown", "grey"],
-    'Material': ["cotton", "denim", "linen", "leather", "silk", "wool", "polyester"],
-    'Style': ["casual", "formal", "boho", "elegant", "sporty", "classic"],
-    'SleeveType': ["sleeveless", "short sleeve", "long sleeve", "cap sleeve", "three-quarter sleeve"],
-    'Neckline': ["v-neck", "round neck", "boat neck", "collared", "square neck"],
-    'Pattern': ["solid", "floral", "striped", "checked", "polka dot", "printed"]
-}
-
-# Generate caption using BLIP Large
-def generate_caption(image: Image.Image) -> str:
-    inputs = processor_blip(images=image, return_tensors="pt")
-    with torch.no_grad():
-        out = model_blip.generate(**inputs.to("cpu"))
-    caption = processor_blip.decode(out[0], skip_special_tokens=True)
-    return caption
-
-# Fallback CLIP tag suggestion
-def generate_clip_tags(image: Image.Image) -> list:
-    inputs = clip_processor(images=image, return_tensors="pt")
-    with torch.no_grad():
-        outputs = clip_model.get_image_features(**inputs.to("cpu"))
-    return outputs.tolist()  # Placeholder for future label projection
-
-# Parse attributes from caption using NLP
-def parse_attributes_from_caption(caption: str) -> dict:
-    doc = nlp(caption.lower())
-    attributes = {cat: "Unknown" for cat in categories}
-
-    for token in doc:
-        for attr, keywords in attribute_keywords.items():
-            for keyword in keywords:
-                if keyword in token.text:
-                    attributes[attr] = keyword.capitalize()
-
-    return attributes
-
-def extract_attributes_from_image(image: Image) -> dict:
-    caption = generate_caption(image)
-    attributes = parse_attributes_from_caption(caption)
-    attributes['caption'] = caption
-    return attributes
-
-def enrich_attributes_from_images(image_files: list) -> pd.DataFrame:
-    data = []
-    for image_file in image_files:
-        try:
-            image = Image.open(image_file)
-            attributes = extract_attributes_from_image(image)
-            attributes['image_path'] = image_file.name
-            data.append(attributes)
-        except UnidentifiedImageError:
-            st.warning(f"Could not process {image_file.name}: Unrecognized image format")
-        except Exception as e:
-            st.warning(f"Error processing {image_file.name}: {e}")
-
-    df = pd.DataFrame(data)
-    return df
-
-def enrich_and_export_attributes(image_files: list) -> pd.DataFrame:
-    enriched_data = enrich_attributes_from_images(image_files)
-    enriched_data.to_csv("candidate_attributes.csv", index=False)
-    return enriched_data
+def load_clip_model(profile=None):
+    return get_clip(profile)
 
 # Streamlit UI
-st.title("PickWise – Attribute Extractor")
-
-uploaded_files = st.file_uploader("Upload product images", accept_multiple_files=True, type=["jpg", "jpeg", "png"])
-
-if uploaded_files:
-    with st.spinner("Extracting attributes..."):
-        result_df = enrich_attributes_from_images(uploaded_files)
-        st.success("Attributes extracted successfully!")
-        st.dataframe(result_df)
-
-        csv = result_df.to_csv(index=False).encode('utf-8')
-        st.download_button("Download Attributes CSV", csv, file_name="candidate_attributes.csv", mime="text/csv")
-else:
-    st.info("Please upload images to begin.")
-
-st.markdown("---")
-st.caption("PickWise – Smarter Choices. Sharper Assortments.")
+def main():
+    st.title("PickWise – Attribute Extractor")
+    # Uploads live in a per-session workspace; other sessions' files are never touched
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
+        # New session: reclaim the workspaces of sessions that have ended
+        prune_workspaces(keep=st.session_state["session_id"])
+    session_id = st.session_state["session_id"]
+
+    uploaded_files = st.file_uploader("Upload product images", accept_multiple_files=True, type=["jpg", "jpeg", "png"])
+
+    mode = st.sidebar.radio("Extraction mode", ["caption", "clip"],
+                            format_func=lambda m: "BLIP captions (accurate)" if m == "caption" else "CLIP zero-shot (fast)")
+    # Throughput vs. memory: images per model call
+    batch_size = st.sidebar.slider("Batch size", min_value=1, max_value=max(32, DEFAULT_BATCH_SIZE), value=DEFAULT_BATCH_SIZE)
+    # Off by default; hooks cost nothing until enabled
+    if st.sidebar.checkbox("Diagnostics", value=instrumentation.is_enabled()):
+        instrumentation.enable()
+    else:
+        instrumentation.disable()
+    # Speed vs. fidelity; compare with `python inference_profiles.py <samples>`
+    profile = st.sidebar.selectbox("Inference profile", list(PROFILES), index=list(PROFILES).index(DEFAULT_PROFILE))
+
+    # Warm up only the model this mode needs, so the first upload isn't charged for it
+    with st.spinner("Loading model..."):
+        load_clip_model(profile) if mode == "clip" else load_blip_model(profile)
+
+    if st.sidebar.button("Clear my uploads"):
+        clear_temp_images(session_id)
+
+    if uploaded_files:
+        with st.spinner("Extracting attributes..."):
+            uploads = load_uploaded_images(uploaded_files, session_id)
+            # A thumbnail only fails when the file does not decode as an image
+            for u in uploads:
+                if u["thumbnail_path"] is None:
+                    st.warning(f"Could not process {u['image_name']}: Unrecognized image format")
+            uploads = [u for u in uploads if u["thumbnail_path"] is not None]
+            # Each distinct image is extracted once, from its model-resolution thumbnail
+            unique = list({u["content_hash"]: u for u in uploads}.values())
+            unique_df = enrich_attributes_from_images([u["thumbnail_path"] for u in unique], batch_size=batch_size,
+                                                      mode=mode, profile=profile, skip_errors=True,
+                                                      names=[u["content_hash"] for u in unique])
+            image_names = {u["content_hash"]: u["image_name"] for u in unique}
+            for content_hash, error in unique_df.attrs.get("errors", {}).items():
+                if isinstance(error, UnidentifiedImageError):
+                    st.warning(f"Could not process {image_names[content_hash]}: Unrecognized image format")
+                else:
+                    st.warning(f"Error processing {image_names[content_hash]}: {error}")
+            names = pd.DataFrame({"image_path": [u["image_name"] for u in uploads],
+                                  "content_hash": [u["content_hash"] for u in uploads]})
+            result_df = unique_df if unique_df.empty else names.merge(
+                unique_df.rename(columns={"image_path": "content_hash"}), on="content_hash"
+            ).drop(columns="content_hash")
+            result_df.attrs = unique_df.attrs
+            st.success("Attributes extracted successfully!")
+            st.caption(f"Caption cache hit rate: {result_df.attrs.get('cache_hit_rate', 0.0):.0%}")
+            st.image([u["thumbnail_path"] for u in unique], caption=[u["image_name"] for u in unique], width=150)
+            st.dataframe(result_df)
+
+            # CSV stays as the export format; pipeline artifacts are Parquet (storage.py)
+            csv = result_df.to_csv(index=False).encode('utf-8')
+            st.download_button("Download Attributes CSV", csv, file_name="candidate_attributes.csv", mime="text/csv")
+    else:
+        st.info("Please upload images to begin.")
+
+    if instrumentation.is_enabled():
+        instrumentation.render_streamlit_panel()
+
+    st.markdown("---")
+    st.caption("PickWise – Smarter Choices. Sharper Assortments.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,300 @@
+import itertools
+import numpy as np
 import pandas as pd
 from PIL import Image
-import torch
-from torchvision import transforms
-from transformers import BlipProcessor, BlipForConditionalGeneration, CLIPProcessor, CLIPModel
-import spacy
 import re
+from caption_engine import caption_images, caption_batch, map_image_batches, DEFAULT_BATCH_SIZE, DEFAULT_NUM_PROCESSES
+from caption_cache import CaptionCache, cache_lookup_hook, image_content_hash
+from caption_parser import (categories, attribute_keywords, parse_attributes_from_caption, parse_many,
+                            match_many, attributes_from_matches)
+from clip_classifier import clip_attributes, clip_scores, embed_images
+from attribute_scores import caption_scores, fuse_scores, compress, top_labels, label_columns, CODE_DTYPE, SCORE_DTYPE
+from embedding_store import EmbeddingStore
+from image_fetcher import ImageFetcher
+from storage import write_artifact
+from model_registry import BLIP_MODEL_NAME, CLIP_MODEL_NAME, get_blip, get_clip, preload
+from inference_profiles import get_profile
+from instrumentation import count
+from image_dedup import NearDuplicateIndex, cluster_images, image_hashes, DEFAULT_MAX_DISTANCE
 
-# Load enhanced BLIP Large model
-processor_blip = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")
-model_blip = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large")
-model_blip.eval()
+# Models are loaded on first use through model_registry; call preload() to warm up.
+# The old module-level names still resolve, lazily.
+_LAZY_MODELS = {
+    "processor_blip": (get_blip, 0),
+    "model_blip": (get_blip, 1),
+    "clip_processor": (get_clip, 0),
+    "clip_model": (get_clip, 1),
+}
 
-# Load CLIP for backup attribute hints
-clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-clip_model.eval()
+def __getattr__(name):
+    if name in _LAZY_MODELS:
+        loader, position = _LAZY_MODELS[name]
+        return loader()[position]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Load spaCy NLP model
-nlp = spacy.load("en_core_web_sm")
+# Bump whenever caption parsing changes so cached attributes are recomputed
+CACHE_VERSION = "3"
 
-categories = ['Color', 'Material', 'Style', 'SleeveType', 'Neckline', 'Pattern']
+_caption_caches = {}
 
-attribute_keywords = {
-    'Color': ["red", "blue", "green", "yellow", "black", "white", "pink", "purple", "orange", "beige", "brown", "grey"],
-    'Material': ["cotton", "denim", "linen", "leather", "silk", "wool", "polyester"],
-    'Style': ["casual", "formal", "boho", "elegant", "sporty", "classic"],
-    'SleeveType': ["sleeveless", "short sleeve", "long sleeve", "cap sleeve", "three-quarter sleeve"],
-    'Neckline': ["v-neck", "round neck", "boat neck", "collared", "square neck"],
-    'Pattern': ["solid", "floral", "striped", "checked", "polka dot", "printed"]
-}
+def get_caption_cache(model_name: str = BLIP_MODEL_NAME, profile: str = None) -> CaptionCache:
+    # Profiles can change the output, so each one gets its own cache namespace
+    profile_name = get_profile(profile).name
+    if profile_name != "fp32":
+        model_name = f"{model_name}@{profile_name}"
+    if model_name not in _caption_caches:
+        _caption_caches[model_name] = CaptionCache(model_name=model_name, model_version=CACHE_VERSION)
+    return _caption_caches[model_name]
 
 # Generate caption using BLIP Large
 def generate_caption(image: Image.Image) -> str:
+    import torch
+    processor_blip, model_blip = get_blip()
     inputs = processor_blip(images=image, return_tensors="pt")
     with torch.no_grad():
         out = model_blip.generate(**inputs)
     caption = processor_blip.decode(out[0], skip_special_tokens=True)
     return caption
 
-# Fallback CLIP tag suggestion
-def generate_clip_tags(image: Image.Image) -> list:
-    inputs = clip_processor(images=image, return_tensors="pt")
-    with torch.no_grad():
-        outputs = clip_model.get_image_features(**inputs)
-    return outputs.tolist()  # Placeholder for future label projection
-
-# Parse attributes from caption using NLP
-def parse_attributes_from_caption(caption: str) -> dict:
-    doc = nlp(caption.lower())
-    attributes = {cat: "Unknown" for cat in categories}
-
-    for token in doc:
-        for attr, keywords in attribute_keywords.items():
-            for keyword in keywords:
-                if keyword in token.text:
-                    attributes[attr] = keyword.capitalize()
-
-    return attributes
+# Zero-shot CLIP attribute tags
+def generate_clip_tags(image: Image.Image) -> dict:
+    clip_processor, clip_model = get_clip()
+    return clip_attributes([image], clip_processor, clip_model)[0]
 
 def extract_attributes_from_image(image: Image) -> dict:
     caption = generate_caption(image)
     attributes = parse_attributes_from_caption(caption)
     return attributes
 
-def enrich_attributes_from_images(image_files: list) -> pd.DataFrame:
-    data = []
-    for image_file in image_files:
-        image = Image.open(image_file)
-        attributes = extract_attributes_from_image(image)
-        attributes['image_path'] = image_file.name
+def _image_name(image_file) -> str:
+    if isinstance(image_file, str):
+        return image_file
+    return getattr(image_file, "name", None) or getattr(image_file, "filename", None) or ""
+
+def enrich_attributes_from_images(image_files: list, batch_size: int = DEFAULT_BATCH_SIZE,
+                                  num_processes: int = DEFAULT_NUM_PROCESSES,
+                                  use_cache: bool = True, mode: str = "caption",
+                                  names: list = None, skip_errors: bool = False,
+                                  profile: str = None, dedupe: bool = False,
+                                  max_distance: int = DEFAULT_MAX_DISTANCE) -> pd.DataFrame:
+    """
+    mode="caption" captions with BLIP and parses the text; mode="clip" is the
+    fast path that scores labels with a single CLIP pass and skips generation;
+    mode="hybrid" does both and blends caption mentions with CLIP similarity.
+    image_files may also be decoded PIL images, named through names.
+    profile selects an inference_profiles profile (default fp32).
+
+    Besides one value per category and the caption (None in clip mode), every
+    row carries attribute_codes (int16) and attribute_scores (float32): all
+    labels kept per category with their confidences, as described in
+    attribute_scores.py.
+
+    dedupe=True groups near-duplicate images (re-crops, resized copies, the
+    same shot on several listings) by perceptual hash, extracts one image per
+    group and copies its attributes to the others; their duplicate_of column
+    names the image that was extracted (see image_dedup.py).
+    """
+    image_files = list(image_files)
+    names = list(names) if names is not None else [_image_name(f) for f in image_files]
+    if dedupe:
+        representatives = cluster_images(image_files, max_distance=max_distance)
+        keep = np.flatnonzero(representatives == np.arange(len(image_files)))
+        df = enrich_attributes_from_images([image_files[idx] for idx in keep], batch_size=batch_size,
+                                           num_processes=num_processes, use_cache=use_cache, mode=mode,
+                                           names=keep.tolist(), skip_errors=skip_errors, profile=profile)
+        return _fan_out_duplicates(df, names, representatives)
+    profile = get_profile(profile)
+    model_name = {"clip": CLIP_MODEL_NAME,
+                  "hybrid": f"{BLIP_MODEL_NAME}+{CLIP_MODEL_NAME}"}.get(mode, BLIP_MODEL_NAME)
+    cache = get_caption_cache(model_name, profile.name) if use_cache else None
+    lookup, keys, hits = cache_lookup_hook(cache) if cache is not None else (None, {}, {})
+
+    if mode == "clip":
+        clip_processor, clip_model = get_clip(profile.name)
+        results, errors = map_image_batches(
+            image_files, lambda images: list(clip_scores(images, clip_processor, clip_model)),
+            batch_size=batch_size, lookup=lookup)
+        captions = [""] * len(image_files)
+    elif mode == "hybrid":
+        processor_blip, model_blip = get_blip(profile.name)
+        clip_processor, clip_model = get_clip(profile.name)
+
+        def batch_fn(images):
+            return list(zip(caption_batch(images, processor_blip, model_blip, profile.generate_kwargs),
+                            clip_scores(images, clip_processor, clip_model)))
+        results, errors = map_image_batches(image_files, batch_fn, batch_size=batch_size, lookup=lookup)
+        # Cache hits come back as the cached caption string
+        captions = [r[0] if isinstance(r, tuple) else r for r in results]
+    else:
+        # Worker processes load their own models, so skip the in-process load
+        processor_blip, model_blip = get_blip(profile.name) if num_processes <= 1 else (None, None)
+        captions, errors = caption_images(image_files, processor_blip, model_blip,
+                                          batch_size=batch_size, num_processes=num_processes,
+                                          lookup=lookup, generate_kwargs=profile.generate_kwargs,
+                                          profile=profile.name)
+    if errors and not skip_errors:
+        raise errors[min(errors)]
+
+    misses = [idx for idx in range(len(image_files)) if idx not in hits and idx not in errors]
+    parsed = {}
+    if misses:
+        matches = match_many(captions[idx] for idx in misses) if mode != "clip" else None
+        scores = fuse_scores(
+            caption=caption_scores(matches) if matches is not None else None,
+            clip=np.stack([results[idx][1] if mode == "hybrid" else results[idx] for idx in misses])
+            if mode != "caption" else None,
+        )
+        for pos, (idx, (codes, label_scores)) in enumerate(zip(misses, compress(scores))):
+            # Captions keep their last-mention value; CLIP-based modes take the top score
+            attributes = (attributes_from_matches(matches[pos]) if mode == "caption"
+                          else top_labels(codes, label_scores))
+            attributes['attribute_codes'] = codes.tolist()
+            attributes['attribute_scores'] = [float(s) for s in label_scores]
+            parsed[idx] = attributes
+
+    data, codes, scores = [], [], []
+    for idx, caption in enumerate(captions):
+        if idx in errors:
+            continue
+        if idx in hits:
+            attributes = dict(hits[idx])
+        else:
+            attributes = parsed[idx]
+            if cache is not None:
+                cache.put(keys[idx], caption, attributes)
+        attributes = dict(attributes)
+        codes.append(np.asarray(attributes.pop('attribute_codes'), dtype=CODE_DTYPE))
+        scores.append(np.asarray(attributes.pop('attribute_scores'), dtype=SCORE_DTYPE))
+        # CLIP-only rows have no caption
+        attributes['caption'] = caption or None
+        attributes['image_path'] = names[idx]
         data.append(attributes)
 
-    df = pd.DataFrame(data)
+    if cache is not None:
+        cache.flush()
+    df = pd.DataFrame(data).assign(**label_columns(codes, scores)) if data else pd.DataFrame()
+    # With skip_errors the failures are reported here instead of raised
+    df.attrs['errors'] = {names[idx]: error for idx, error in errors.items()}
+    if cache is not None:
+        # Returned with the frame; the counters give the running rate in metrics
+        df.attrs['cache_hit_rate'] = len(hits) / max(1, len(keys))
+        count("caption_cache.lookups", len(keys))
+        count("caption_cache.hits", len(hits))
     return df
 
-def enrich_and_export_attributes(image_files: list) -> pd.DataFrame:
-    enriched_data = enrich_attributes_from_images(image_files)
-    enriched_data.to_csv("candidate_attributes.csv", index=False)
+def _fan_out_duplicates(df: pd.DataFrame, names: list, representatives) -> pd.DataFrame:
+    # df rows are keyed by the position of their cluster representative in image_path
+    errors = {names[pos]: error for pos, error in df.attrs.get('errors', {}).items()}
+    if df.empty:
+        df.attrs['errors'] = errors
+        return df
+    members = pd.DataFrame({
+        "representative": representatives,
+        "image_path": names,
+        "duplicate_of": [names[rep] if rep != idx else None for idx, rep in enumerate(representatives)],
+    })
+    fanned = members.merge(df.rename(columns={"image_path": "representative"}), on="representative")
+    fanned = fanned.drop(columns="representative")
+    fanned.attrs = dict(df.attrs, errors=errors, near_duplicates=int(fanned["duplicate_of"].notna().sum()))
+    return fanned
+
+def embed_images_to_store(image_files: list, store: EmbeddingStore = None, urls: list = None,
+                          batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """
+    Write CLIP image embeddings to the store, skipping images whose content hash
+    is already stored or appears earlier in image_files. Returns the store row
+    of every image (-1 on failure).
+    """
+    image_files = list(image_files)
+    clip_processor, clip_model = get_clip()
+    if store is None:
+        store = EmbeddingStore(dim=clip_model.config.projection_dim)
+    hashes, first_seen, same_as = {}, {}, {}
+    repeat = object()
+
+    def lookup(idx, image):
+        hashes[idx] = image_content_hash(image)
+        row = store.lookup([hashes[idx]], by="image_hash")[0]
+        if row >= 0:
+            return int(row)
+        # Repeats within this call are embedded once and share its row
+        first = first_seen.setdefault(hashes[idx], idx)
+        if first != idx:
+            same_as[idx] = first
+            return repeat
+        return None
+
+    results, errors = map_image_batches(
+        image_files, lambda images: list(embed_images(images, clip_processor, clip_model)),
+        batch_size=batch_size, lookup=lookup)
+    if errors:
+        print(f"Skipped {len(errors)} images that could not be embedded")
+
+    rows = np.full(len(image_files), -1, dtype=np.int64)
+    new = [idx for idx, result in enumerate(results) if isinstance(result, np.ndarray)]
+    if new:
+        rows[new] = store.append(np.stack([results[idx] for idx in new]),
+                                 urls=[urls[idx] for idx in new] if urls is not None else None,
+                                 image_hashes=[hashes[idx] for idx in new])
+    for idx, result in enumerate(results):
+        if isinstance(result, int):
+            rows[idx] = result
+    for idx, first in same_as.items():
+        rows[idx] = rows[first]
+    return rows
+
+def enrich_scraped_products(products: pd.DataFrame, url_column: str = "image_url", chunk_size: int = 256,
+                            mode: str = "caption", fetcher: ImageFetcher = None, dedupe: bool = False,
+                            max_distance: int = DEFAULT_MAX_DISTANCE, **enrich_kwargs) -> pd.DataFrame:
+    """
+    Download product images from a scraper DataFrame and extract attributes end to end.
+
+    Images are fetched concurrently, deduplicated by URL and content, decoded at
+    model resolution and streamed into the extractor chunk by chunk; the
+    attributes are fanned back out to every product row sharing an image.
+
+    dedupe=True also merges near-duplicate images across the whole catalogue
+    (one near-duplicate index spans all chunks), so only the first image of
+    each group is extracted; duplicate_of holds that image's hash.
+    """
+    fetcher = fetcher or ImageFetcher()
+    stream = fetcher.iter_images(products[url_column])
+    index = NearDuplicateIndex(max_distance) if dedupe else None
+    seen, duplicate_of = [], {}
+    frames = []
+    while True:
+        chunk = list(itertools.islice(stream, chunk_size))
+        if not chunk:
+            break
+        hashes, images = zip(*chunk)
+        if index is not None:
+            representatives = index.assign(*image_hashes(images))
+            seen.extend(hashes)
+            duplicate_of.update((h, seen[rep]) for h, rep in zip(hashes, representatives) if seen[rep] != h)
+            keep = [idx for idx, h in enumerate(hashes) if h not in duplicate_of]
+            hashes, images = [hashes[idx] for idx in keep], [images[idx] for idx in keep]
+            if not keep:
+                continue
+        frames.append(enrich_attributes_from_images(images, names=hashes, mode=mode,
+                                                    skip_errors=True, **enrich_kwargs))
+    if fetcher.failed:
+        print(f"Could not download {len(fetcher.failed)} product images")
+    if duplicate_of:
+        print(f"Reused attributes for {len(duplicate_of)} near-duplicate product images")
+
+    enriched = products.copy()
+    enriched['image_hash'] = enriched[url_column].map(fetcher.url_to_hash)
+    if not frames:
+        return enriched
+    attributes = pd.concat(frames, ignore_index=True).rename(columns={'image_path': 'image_hash'})
+    if index is None:
+        return enriched.merge(attributes, on='image_hash', how='left')
+    enriched['duplicate_of'] = enriched['image_hash'].map(duplicate_of)
+    source = enriched['duplicate_of'].fillna(enriched['image_hash']).rename('source_hash')
+    attributes = attributes.rename(columns={'image_hash': 'source_hash'})
+    return enriched.join(source).merge(attributes, on='source_hash', how='left').drop(columns='source_hash')
+
+def enrich_and_export_attributes(image_files: list, mode: str = "caption") -> pd.DataFrame:
+    enriched_data = enrich_attributes_from_images(image_files, mode=mode)
+    write_artifact(enriched_data, "candidate_attributes")
     return enriched_data
@@ -0,0 +1,187 @@
+"""
+Multi-label attribute scores in columnar form.
+
+Every (category, keyword) pair in caption_parser.attribute_keywords gets a
+fixed int16 label code. An image's attributes are stored as two parallel
+arrays, attribute_codes (int16) and attribute_scores (float32), holding
+every label that survived pruning with its confidence. Within a category
+the scores of one image sum to at most 1. In a DataFrame both are Arrow
+list columns (label_columns), so a whole table is two flat buffers plus
+offsets and score_matrix turns it into CSR without a per-row loop.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import scipy.sparse as sp
+from caption_parser import categories, attribute_keywords
+
+CODE_DTYPE = np.int16
+SCORE_DTYPE = np.float32
+
+# Code -> (category, keyword); same order as the CLIP text bank
+LABELS = [(cat, keyword) for cat in categories for keyword in attribute_keywords[cat]]
+LABEL_CATEGORY = np.array([categories.index(cat) for cat, _ in LABELS], dtype=np.int8)
+CATEGORY_SLICES = {}
+for _cat in categories:
+    _codes = np.flatnonzero(LABEL_CATEGORY == categories.index(_cat))
+    CATEGORY_SLICES[_cat] = slice(int(_codes[0]), int(_codes[-1]) + 1)
+_LABEL_CODES = {(cat, keyword.lower()): code for code, (cat, keyword) in enumerate(LABELS)}
+
+# Extractor categories -> lowercase attribute columns of the scorers
+CATEGORY_COLUMNS = {
+    "Color": "color",
+    "Material": "material",
+    "Style": "style",
+    "SleeveType": "sleeve_type",
+    "Neckline": "neckline",
+    "Pattern": "print",
+}
+
+DEFAULT_TOP_K = 3
+DEFAULT_MIN_SCORE = 0.05
+# Share of the fused score taken from caption mentions in hybrid mode
+DEFAULT_CAPTION_WEIGHT = 0.5
+
+
+def label_code(category, keyword):
+    """
+    Code of a (category, keyword) pair, case-insensitive, or -1 if unknown.
+    """
+    return _LABEL_CODES.get((category, str(keyword).lower()), -1)
+
+
+def caption_scores(matches_per_caption) -> np.ndarray:
+    """
+    Dense (captions x labels) scores from caption_parser.match_many output:
+    each category's mentions are normalized to sum to 1.
+    """
+    scores = np.zeros((len(matches_per_caption), len(LABELS)), dtype=SCORE_DTYPE)
+    for row, matches in enumerate(matches_per_caption):
+        for cat, keyword in matches:
+            code = label_code(cat, keyword)
+            if code >= 0:
+                scores[row, code] += 1
+    return _normalize_categories(scores)
+
+
+def _normalize_categories(scores: np.ndarray) -> np.ndarray:
+    for cat_slice in CATEGORY_SLICES.values():
+        totals = scores[:, cat_slice].sum(axis=1, keepdims=True)
+        np.divide(scores[:, cat_slice], totals, out=scores[:, cat_slice], where=totals > 0)
+    return scores
+
+
+def fuse_scores(caption=None, clip=None, caption_weight: float = DEFAULT_CAPTION_WEIGHT) -> np.ndarray:
+    """
+    Blend caption and CLIP score matrices per category. Where a caption never
+    mentions a category, the CLIP distribution is used as is.
+    """
+    if caption is None or clip is None:
+        return np.asarray(caption if clip is None else clip, dtype=SCORE_DTYPE)
+    fused = np.asarray(clip, dtype=SCORE_DTYPE).copy()
+    for cat_slice in CATEGORY_SLICES.values():
+        mentioned = caption[:, cat_slice].sum(axis=1) > 0
+        fused[mentioned, cat_slice] = (caption_weight * caption[mentioned, cat_slice]
+                                       + (1 - caption_weight) * fused[mentioned, cat_slice])
+    return fused
+
+
+def compress(scores: np.ndarray, top_k: int = DEFAULT_TOP_K, min_score: float = DEFAULT_MIN_SCORE) -> list:
+    """
+    Keep the top_k labels per category scoring at least min_score and return
+    one (codes, scores) pair of arrays per row, ordered by code.
+    """
+    scores = np.asarray(scores, dtype=SCORE_DTYPE)
+    keep = scores >= min_score
+    for cat_slice in CATEGORY_SLICES.values():
+        width = cat_slice.stop - cat_slice.start
+        if width > top_k:
+            block = scores[:, cat_slice]
+            kth = np.partition(block, width - top_k, axis=1)[:, width - top_k][:, None]
+            keep[:, cat_slice] &= block >= kth
+    return [(np.flatnonzero(row_keep).astype(CODE_DTYPE), row_scores[row_keep])
+            for row_keep, row_scores in zip(keep, scores)]
+
+
+def top_labels(codes, scores) -> dict:
+    """
+    Highest-scoring keyword per category (capitalized), "Unknown" if none.
+    """
+    best = {cat: ("Unknown", -1.0) for cat in categories}
+    for code, score in zip(codes, scores):
+        cat, keyword = LABELS[code]
+        if score > best[cat][1]:
+            best[cat] = (keyword.capitalize(), score)
+    return {cat: label for cat, (label, _) in best.items()}
+
+
+def label_columns(codes: list, scores: list) -> dict:
+    """
+    attribute_codes / attribute_scores columns from per-row arrays. Each is an
+    Arrow list column: one flat values buffer plus row offsets.
+    """
+    lengths = np.fromiter((len(c) for c in codes), dtype=np.int32, count=len(codes))
+    offsets = pa.array(np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32))
+    flat_codes = np.concatenate(codes).astype(CODE_DTYPE) if len(codes) else np.zeros(0, CODE_DTYPE)
+    flat_scores = np.concatenate(scores).astype(SCORE_DTYPE) if len(scores) else np.zeros(0, SCORE_DTYPE)
+    return {
+        "attribute_codes": pd.arrays.ArrowExtensionArray(pa.ListArray.from_arrays(offsets, pa.array(flat_codes))),
+        "attribute_scores": pd.arrays.ArrowExtensionArray(pa.ListArray.from_arrays(offsets, pa.array(flat_scores))),
+    }
+
+
+def _flat_labels(values: pd.Series, value_type):
+    # (lengths, flat values) of a list column, whatever pandas holds it as;
+    # Parquet reads give object arrays, missing rows (NaN/None) have length 0
+    if isinstance(values.dtype, pd.ArrowDtype):
+        array = pa.array(values)
+    else:
+        array = pa.array(values.to_numpy(dtype=object), type=pa.list_(value_type), from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    lengths = pc.fill_null(pc.list_value_length(array), 0).to_numpy(zero_copy_only=False)
+    return lengths, array.flatten().to_numpy(zero_copy_only=False)
+
+
+def _column_labels(df: pd.DataFrame, rows: np.ndarray, columns: dict = CATEGORY_COLUMNS):
+    # (rows, codes) of the label named by each string attribute column, for
+    # tables that were never scored (e.g. scraped competitor listings)
+    found_rows, found_codes = [], []
+    for cat, column in columns.items():
+        source = column if column in df else cat if cat in df else None
+        if source is None:
+            continue
+        keywords = pd.Index([keyword.lower() for keyword in attribute_keywords[cat]])
+        values = df[source].iloc[rows].astype("string").str.lower()
+        codes = pd.Categorical(values, categories=keywords).codes
+        present = np.flatnonzero(codes >= 0)
+        found_rows.append(rows[present])
+        found_codes.append(codes[present].astype(np.int32) + CATEGORY_SLICES[cat].start)
+    if not found_rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int32)
+    return np.concatenate(found_rows), np.concatenate(found_codes)
+
+
+def score_matrix(df: pd.DataFrame) -> sp.csr_matrix:
+    """
+    Weighted (rows x labels) CSR feature matrix read straight from the
+    attribute_codes / attribute_scores columns; rows without them fall back
+    to their string attribute columns, with score 1.
+    Accepts either the extractor's category columns or the scorers' columns.
+    """
+    n = len(df)
+    if "attribute_codes" in df and "attribute_scores" in df:
+        lengths, codes = _flat_labels(df["attribute_codes"], pa.int16())
+        _, scores = _flat_labels(df["attribute_scores"], pa.float32())
+        missing = np.flatnonzero(df["attribute_codes"].isna().to_numpy())
+    else:
+        lengths, codes, scores = np.zeros(n, np.int64), np.zeros(0, np.int32), np.zeros(0, SCORE_DTYPE)
+        missing = np.arange(n)
+
+    fallback_rows, fallback_codes = _column_labels(df, missing) if len(missing) else (np.zeros(0, np.int64),
+                                                                                       np.zeros(0, np.int32))
+    rows = np.concatenate([np.repeat(np.arange(n), lengths), fallback_rows])
+    cols = np.concatenate([codes.astype(np.int32), fallback_codes])
+    data = np.concatenate([scores.astype(SCORE_DTYPE), np.ones(len(fallback_rows), dtype=SCORE_DTYPE)])
+    return sp.csr_matrix((data, (rows, cols)), shape=(n, len(LABELS)))
@@ -0,0 +1,349 @@
+"""
+Reproducible performance benchmarks for the PickWise pipeline stages.
+
+Synthetic candidate, past-brand and competitor assortments are generated
+from a fixed seed at each requested size, and every stage is timed on its
+own in a fresh process so its peak RSS is not polluted by the others:
+
+    python benchmarks.py --sizes 1000,10000 --output bench.json
+    python benchmarks.py --sizes 1000,10000 --baseline bench_baseline.json --threshold 0.2
+    python benchmarks.py --sizes 1000 --save-baseline bench_baseline.json
+
+Results are written as JSON (one record per stage and size with the best
+and median wall time, throughput and peak RSS). With --baseline, any stage
+whose best time is more than --threshold slower than the baseline is
+reported and the exit status is 1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from instrumentation import peak_rss_mb
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_SEED = 42
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2
+
+LENGTHS = ["mini", "midi", "maxi", "cropped", "regular"]
+OCCASIONS = ["party", "office", "vacation", "everyday", "wedding"]
+TEXTURES = ["smooth", "ribbed", "textured", "sheer"]
+
+
+def make_assortment(n, seed=DEFAULT_SEED, brand=None):
+    """
+    Synthetic assortment of n designs with the attribute columns both scorers
+    read and a design_description assembled from the same attributes.
+    """
+    from caption_parser import attribute_keywords
+    rng = np.random.default_rng(seed)
+
+    def pick(values, missing=0.1):
+        column = rng.choice(np.array(values, dtype=object), n)
+        column[rng.random(n) < missing] = None
+        return column
+
+    df = pd.DataFrame({
+        "color": pick(attribute_keywords["Color"]),
+        "material": pick(attribute_keywords["Material"]),
+        "style": pick(attribute_keywords["Style"]),
+        "print": pick(attribute_keywords["Pattern"]),
+        "neckline": pick(attribute_keywords["Neckline"], 0.3),
+        "sleeve_type": pick(attribute_keywords["SleeveType"], 0.3),
+        "length": pick(LENGTHS, 0.2),
+        "occasion": pick(OCCASIONS, 0.2),
+        "texture": pick(TEXTURES, 0.5),
+    })
+    words = df[["color", "material", "print", "style", "length", "occasion"]].fillna("")
+    df["design_description"] = (words.apply(" ".join, axis=1).str.split().str.join(" ")
+                                + " " + rng.choice(["dress", "top", "shirt", "skirt", "kurta"], n))
+    df["image_path"] = [f"img_{seed}_{i}.jpg" for i in range(n)]
+    if brand:
+        df["brand"] = brand
+    return df
+
+
+def make_captions(n, seed=DEFAULT_SEED):
+    df = make_assortment(n, seed)
+    templates = ["a woman wearing a {color} {print} {material} dress with {sleeve_type}",
+                 "a {style} {color} top with a {neckline}",
+                 "a model in a {material} {length} skirt"]
+    rng = np.random.default_rng(seed)
+    rows = df.fillna("plain").to_dict("records")
+    return [templates[i].format(**row) for i, row in zip(rng.integers(0, len(templates), n), rows)]
+
+
+def _element(selector):
+    # "tag.class" -> (tag, class)
+    tag, _, cls = selector.partition(".")
+    return tag or "div", cls
+
+
+def make_listing_html(adapter, n, seed=DEFAULT_SEED):
+    """
+    A listing page of n items shaped to the adapter's selectors, standing in
+    for a saved page of that brand.
+    """
+    rng = np.random.default_rng(seed)
+    tag, cls = _element(adapter.item_selector)
+    items = []
+    for i in range(n):
+        name = f"{rng.choice(['Floral', 'Striped', 'Solid'])} {rng.choice(['Dress', 'Top', 'Shirt'])} {i}"
+        values = {"name": name, "url": f"/product/{i}", "image_url": f"https://img.example.com/{i}.jpg"}
+        own, children = {}, {}
+        for field, (selector, attr) in adapter.fields.items():
+            target = own if selector is None else children.setdefault(selector, {})
+            target[attr] = values.get(field, "")
+        child_html = ""
+        for selector, attrs in children.items():
+            child_tag, child_cls = _element(selector)
+            text = attrs.pop("text", "")
+            rendered = "".join(f' {k}="{v}"' for k, v in attrs.items())
+            child_html += f'<{child_tag} class="{child_cls}"{rendered}>{text}</{child_tag}>'
+        text = own.pop("text", "")
+        rendered = "".join(f' {k}="{v}"' for k, v in own.items())
+        items.append(f'<{tag} class="{cls}"{rendered}>{child_html}{text}</{tag}>')
+    return f"<html><body><div class=\"grid\">{''.join(items)}</div></body></html>"
+
+
+# Stages: setup(size, seed) builds untimed inputs and imports what run needs,
+# run(inputs) is timed and returns the number of items processed
+def _setup_parse(size, seed):
+    from caption_parser import get_matcher
+    get_matcher()
+    return make_captions(size, seed)
+
+
+def _run_parse(captions):
+    from caption_parser import parse_attributes_from_caption
+    for caption in captions:
+        parse_attributes_from_caption(caption)
+    return len(captions)
+
+
+def _run_parse_many(captions):
+    from caption_parser import parse_many
+    return len(parse_many(captions))
+
+
+def _setup_scoring(size, seed):
+    import recommendation, buyability_score
+    return (make_assortment(size, seed), make_assortment(size, seed + 1, "Past"),
+            make_assortment(size, seed + 2, "Competitor"))
+
+
+def _run_score_attributes(inputs):
+    from recommendation import compute_buyability_scores
+    candidates, past, competitors = inputs
+    return len(compute_buyability_scores(candidates, past, competitors))
+
+
+def _run_score_text(inputs):
+    from buyability_score import compute_buyability_scores
+    candidates, past, competitors = inputs
+    return len(compute_buyability_scores(candidates, past, competitors))
+
+
+def _setup_recommend(size, seed):
+    import recommendation
+    df = make_assortment(size, seed)
+    df["buyability_score"] = np.random.default_rng(seed).random(size)
+    return df
+
+
+def _run_recommend(df):
+    from recommendation import recommend_top_n
+    recommend_top_n(df.copy(), top_n=50)
+    return len(df)
+
+
+def _run_recommend_diverse(df):
+    from recommendation import recommend_top_n
+    recommend_top_n(df.copy(), top_n=50, diversity=0.3)
+    return len(df)
+
+
+def _setup_scrape(size, seed):
+    from scraper import BRAND_ADAPTERS
+    html_dir = os.environ.get("PICKWISE_BENCH_HTML_DIR")
+    pages = []
+    for brand, adapter in BRAND_ADAPTERS.items():
+        saved = []
+        if html_dir and os.path.isdir(html_dir):
+            prefix = brand.lower().replace("&", "")
+            saved = [os.path.join(html_dir, f) for f in sorted(os.listdir(html_dir))
+                     if f.lower().startswith(prefix) and f.endswith(".html")]
+        for path in saved:
+            with open(path, encoding="utf-8") as f:
+                pages.append((adapter, f.read()))
+        if not saved:
+            pages.append((adapter, make_listing_html(adapter, size, seed)))
+    return pages
+
+
+def _run_scrape(pages):
+    from scraper import parse_listing_html
+    return sum(len(parse_listing_html(html, adapter, base_url="https://example.com", limit=10 ** 9))
+               for adapter, html in pages)
+
+
+STAGES = {
+    "parse_attributes_from_caption": (_setup_parse, _run_parse),
+    "parse_many": (_setup_parse, _run_parse_many),
+    "score_attributes": (_setup_scoring, _run_score_attributes),
+    "score_text": (_setup_scoring, _run_score_text),
+    "recommend_top_n": (_setup_recommend, _run_recommend),
+    "recommend_top_n_diverse": (_setup_recommend, _run_recommend_diverse),
+    "scrape_parse_listing": (_setup_scrape, _run_scrape),
+}
+
+
+def _measure(stage, size, seed, repeat):
+    setup, run = STAGES[stage]
+    inputs = setup(size, seed)
+    times, items = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = run(inputs)
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        "stage": stage,
+        "size": size,
+        "items": items,
+        "best_seconds": round(best, 6),
+        "median_seconds": round(statistics.median(times), 6),
+        "throughput_per_sec": round(items / best, 1) if best > 0 else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def _measure_safely(stage, size, seed, repeat):
+    try:
+        return _measure(stage, size, seed, repeat)
+    except ImportError as e:
+        return {"stage": stage, "size": size, "skipped": f"missing dependency: {e.name}"}
+
+
+def run_benchmarks(stages=None, sizes=DEFAULT_SIZES, seed=DEFAULT_SEED, repeat=DEFAULT_REPEAT,
+                   isolate=True) -> dict:
+    """
+    Time each stage at each size; with isolate, every (stage, size) runs in a
+    fresh spawned process so peak_rss_mb is that stage's own high-water mark.
+    """
+    stages = list(stages or STAGES)
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for stage in stages:
+        for size in sizes:
+            if isolate:
+                with context.Pool(1) as pool:
+                    record = pool.apply(_measure_safely, (stage, size, seed, repeat))
+            else:
+                record = _measure_safely(stage, size, seed, repeat)
+            results.append(record)
+            if "skipped" in record:
+                print(f"{stage:<32} {size:>9,}  skipped ({record['skipped']})")
+            else:
+                print(f"{stage:<32} {size:>9,}  {record['best_seconds']:>9.3f}s  "
+                      f"{record['throughput_per_sec'] or 0:>12,.0f}/s  {record['peak_rss_mb']:>8.1f} MB")
+    return {"meta": _environment(seed, repeat, isolate), "results": results}
+
+
+def _environment(seed, repeat, isolate):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "repeat": repeat,
+        "isolated": isolate,
+    }
+
+
+def compare_to_baseline(report, baseline, threshold=DEFAULT_THRESHOLD) -> list:
+    """
+    Stages at least `threshold` (a fraction) slower than the baseline, as
+    dicts with both timings and the ratio.
+    """
+    previous = {(r["stage"], r["size"]): r for r in baseline.get("results", []) if "best_seconds" in r}
+    regressions = []
+    for record in report["results"]:
+        before = previous.get((record["stage"], record["size"]))
+        if before is None or "best_seconds" not in record or not before["best_seconds"]:
+            continue
+        ratio = record["best_seconds"] / before["best_seconds"]
+        if ratio > 1 + threshold:
+            regressions.append({"stage": record["stage"], "size": record["size"],
+                                "baseline_seconds": before["best_seconds"],
+                                "seconds": record["best_seconds"], "ratio": round(ratio, 2)})
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the PickWise pipeline stages on synthetic data.")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated row counts, e.g. 1000,100000,1000000")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--no-isolate", action="store_true", help="Run stages in this process (RSS is cumulative)")
+    parser.add_argument("--html-dir", help="Saved listing pages (<brand>*.html) to parse instead of generated ones")
+    parser.add_argument("--output", default=os.path.join("output", "benchmarks",
+                                                         f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"))
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown over the baseline as a fraction")
+    parser.add_argument("--save-baseline", help="Also write these results as the new baseline")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(sorted(unknown))}")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    if args.html_dir:
+        # Read by the (possibly spawned) scrape stage setup
+        os.environ["PICKWISE_BENCH_HTML_DIR"] = args.html_dir
+
+    report = run_benchmarks(stages, sizes, seed=args.seed, repeat=args.repeat, isolate=not args.no_isolate)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(report, json.load(f), args.threshold)
+        report["baseline"] = {"path": args.baseline, "threshold": args.threshold, "regressions": regressions}
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if regressions:
+        for r in regressions:
+            print(f"REGRESSION {r['stage']} @ {r['size']:,}: {r['baseline_seconds']:.3f}s -> "
+                  f"{r['seconds']:.3f}s ({r['ratio']:.2f}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
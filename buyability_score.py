@@ -2,6 +2,8 @@ import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_distances
+from nn_index import ExactIndex, TextIndex, mean_cosine_distances, mmr_select
+from instrumentation import timer
 
 DEFAULT_WEIGHTS = {
     "newness_brand": 0.2,
@@ -26,24 +28,45 @@ def compute_text_distance(descriptions1, descriptions2):
     dist_matrix = cosine_distances(tfidf[:len(descriptions1)], tfidf[len(descriptions1):])
     return dist_matrix
 
-def compute_newness_to_brand(df_new, df_past):
-    if df_past.empty:
+def compute_min_text_distance(descriptions1, descriptions2):
+    # Same joint TF-IDF fit as compute_text_distance, but the row minimum is
+    # taken block by block instead of materializing the full N x M matrix
+    with timer("distance.text_min", items=len(descriptions1)):
+        corpus = descriptions1.tolist() + descriptions2.tolist()
+        tfidf = TfidfVectorizer().fit_transform(corpus)
+        n = len(descriptions1)
+        distances, _ = ExactIndex().build(tfidf[n:]).query(tfidf[:n], k=1)
+        return distances[:, 0]
+
+def compute_newness(df_new, reference, candidate_matrix=None):
+    """
+    Distance from each new design to its nearest reference design.
+    reference is either a DataFrame or a prebuilt nn_index.TextIndex;
+    candidate_matrix optionally carries the candidates already vectorized
+    with that index's vectorizer.
+    """
+    if len(reference) == 0:
         return np.full(len(df_new), 0.5)
-    dist_matrix = compute_text_distance(df_new['design_description'], df_past['design_description'])
-    return dist_matrix.min(axis=1)
+    if isinstance(reference, TextIndex):
+        queries = candidate_matrix if candidate_matrix is not None else df_new['design_description']
+        with timer("distance.text_index", items=len(df_new)):
+            return reference.min_distances(queries)
+    return compute_min_text_distance(df_new['design_description'], reference['design_description'])
+
+def compute_newness_to_brand(df_new, df_past):
+    return compute_newness(df_new, df_past)
 
 def compute_newness_to_market(df_new, df_comp):
-    if df_comp.empty:
-        return np.full(len(df_new), 0.5)
-    dist_matrix = compute_text_distance(df_new['design_description'], df_comp['design_description'])
-    return dist_matrix.min(axis=1)
+    return compute_newness(df_new, df_comp)
 
-def compute_variety(df):
-    if 'design_description' not in df:
-        return np.full(len(df), 0.5)
-    dist_matrix = compute_text_distance(df['design_description'], df['design_description'])
-    mean_dists = dist_matrix.mean(axis=1)
-    return mean_dists
+def compute_variety(df, candidate_matrix=None):
+    # Mean distance to the rest of the selection, linear in N (see mean_cosine_distances)
+    if candidate_matrix is None:
+        if 'design_description' not in df:
+            return np.full(len(df), 0.5)
+        candidate_matrix = TfidfVectorizer().fit_transform(df['design_description'].tolist())
+    with timer("distance.text_variety", items=len(df)):
+        return mean_cosine_distances(candidate_matrix, candidate_matrix)
 
 def compute_completeness(df):
     if df.empty:
@@ -55,11 +78,34 @@ def compute_completeness(df):
         scores.append(diversity / max(1, len(df)))
     return np.full(len(df), np.mean(scores))
 
-def compute_buyability_scores(df_new, df_past, df_comp, weights=DEFAULT_WEIGHTS):
+def compute_buyability_scores(df_new, df_past, df_comp, weights=DEFAULT_WEIGHTS, text_model=None):
+    """
+    df_past and df_comp may be DataFrames or TextIndex objects built once per
+    reference set with nn_index.build_text_index (and reloaded with load_index).
+
+    With a fitted text_features.TextFeatureModel the candidates are vectorized
+    once and the reference matrices come from the model's cache; prebuilt
+    indexes with a vectorizer of their own re-vectorize the candidates.
+    """
     df = df_new.copy()
-    df['score_newness_brand'] = normalize(compute_newness_to_brand(df, df_past))
-    df['score_newness_market'] = normalize(compute_newness_to_market(df, df_comp))
-    df['score_variety'] = normalize(compute_variety(df))
+    candidate_matrix = None
+    if text_model is not None:
+        candidate_matrix = text_model.transform(df['design_description'])
+        if isinstance(df_past, pd.DataFrame) and not df_past.empty:
+            df_past = text_model.reference_index(df_past['design_description'])
+        if isinstance(df_comp, pd.DataFrame) and not df_comp.empty:
+            df_comp = text_model.reference_index(df_comp['design_description'])
+
+    def shared_matrix(reference):
+        # Candidate vectors only fit indexes built with text_model's own vectorizer
+        if (text_model is not None and isinstance(reference, TextIndex)
+                and reference.vectorizer is text_model.vectorizer):
+            return candidate_matrix
+        return None
+
+    df['score_newness_brand'] = normalize(compute_newness(df, df_past, shared_matrix(df_past)))
+    df['score_newness_market'] = normalize(compute_newness(df, df_comp, shared_matrix(df_comp)))
+    df['score_variety'] = normalize(compute_variety(df, candidate_matrix))
     df['score_completeness'] = compute_completeness(df)
 
     df['buyability_score'] = (
@@ -70,5 +116,16 @@ def compute_buyability_scores(df_new, df_past, df_comp, weights=DEFAULT_WEIGHTS)
     )
     return df
 
-def recommend_top_n(scored_df, n=12):
-    return scored_df.sort_values(by='buyability_score', ascending=False).head(n)
+def recommend_top_n(scored_df, n=12, diversity=0.0, vectors=None):
+    """
+    diversity > 0 switches to greedy MMR selection over vectors (TF-IDF of
+    design_description unless given, e.g. image embeddings), trading score
+    for dissimilarity to the items already picked.
+    """
+    if diversity <= 0 or (vectors is None and 'design_description' not in scored_df):
+        return scored_df.sort_values(by='buyability_score', ascending=False).head(n)
+    if vectors is None:
+        vectors = TfidfVectorizer().fit_transform(scored_df['design_description'].fillna("").tolist())
+    with timer("recommend.mmr", items=len(scored_df)):
+        picks = mmr_select(scored_df['buyability_score'].to_numpy(), vectors, n, diversity)
+    return scored_df.iloc[picks]
@@ -0,0 +1,168 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from PIL import Image
+
+DEFAULT_CACHE_PATH = os.path.join(".pickwise_cache", "captions.sqlite")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Eviction frees down to this share of max_bytes, so it runs rarely once full
+EVICT_TO = 0.9
+# Writes are committed in batches of this many (and on flush/exit)
+COMMIT_EVERY = 64
+
+
+def image_content_hash(image: Image.Image) -> str:
+    """
+    Hash the decoded pixels of an image, so re-encoded or renamed copies of the
+    same shot map to the same key.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class CaptionCache:
+    """
+    Persistent caption + attribute cache keyed by image content hash and model.
+
+    Entries are evicted least-recently-used first once the stored payload
+    exceeds max_bytes. The payload size is tracked as a running total and
+    only re-read from the table when it crosses max_bytes, so a put costs one
+    indexed lookup; writes are committed every COMMIT_EVERY calls, by flush()
+    and at exit.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, model_name="", model_version="", max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.model_key = f"{model_name}@{model_version}"
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS captions (
+                image_hash TEXT NOT NULL,
+                model_key TEXT NOT NULL,
+                caption TEXT NOT NULL,
+                attributes TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (image_hash, model_key)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_captions_access ON captions(last_access)")
+        self._conn.commit()
+        self._total = self._stored_bytes()
+        self._pending = 0
+        atexit.register(self.flush)
+
+    def _stored_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM captions").fetchone()[0]
+
+    def _written(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._conn.commit()
+                self._pending = 0
+
+    def get(self, image_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT caption, attributes FROM captions WHERE image_hash = ? AND model_key = ?",
+                (image_hash, self.model_key),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE captions SET last_access = ? WHERE image_hash = ? AND model_key = ?",
+                (time.time(), image_hash, self.model_key),
+            )
+            self._written()
+        return {"caption": row[0], "attributes": json.loads(row[1])}
+
+    def put(self, image_hash, caption, attributes):
+        payload = json.dumps(attributes)
+        size = len(image_hash) + len(caption) + len(payload)
+        with self._lock:
+            replaced = self._conn.execute(
+                "SELECT size FROM captions WHERE image_hash = ? AND model_key = ?",
+                (image_hash, self.model_key),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO captions VALUES (?, ?, ?, ?, ?, ?)",
+                (image_hash, self.model_key, caption, payload, size, time.time()),
+            )
+            self._total += size - (replaced[0] if replaced else 0)
+            if self._total > self.max_bytes:
+                # Other processes may share the file, so check the real total first
+                self._total = self._stored_bytes()
+                self._evict()
+            self._written()
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        excess = self._total - int(self.max_bytes * EVICT_TO)
+        rows = self._conn.execute("SELECT rowid, size FROM captions ORDER BY last_access")
+        doomed = []
+        for rowid, size in rows:
+            if excess <= 0:
+                break
+            doomed.append((rowid,))
+            excess -= size
+            self._total -= size
+        self._conn.executemany("DELETE FROM captions WHERE rowid = ?", doomed)
+        self._conn.commit()
+        self._pending = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+        self._conn.close()
+
+
+def cache_lookup_hook(cache):
+    """
+    Build a caption_images lookup hook backed by cache.
+
+    Returns (lookup, keys, hits): keys collects the content hash of every decoded
+    image and hits the cached attributes of every cache hit, both by index.
+    """
+    keys, hits = {}, {}
+
+    def lookup(idx, image):
+        keys[idx] = image_content_hash(image)
+        entry = cache.get(keys[idx])
+        if entry is None:
+            return None
+        hits[idx] = entry["attributes"]
+        return entry["caption"]
+
+    return lookup, keys, hits
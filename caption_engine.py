@@ -0,0 +1,232 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+from PIL import Image
+from model_registry import BLIP_MODEL_NAME
+from instrumentation import timer, count
+
+# Throughput knobs: larger batches raise images/sec at the cost of peak memory.
+# Both can be tuned per machine through the environment.
+DEFAULT_BATCH_SIZE = int(os.environ.get("PICKWISE_CAPTION_BATCH_SIZE", 8))
+DEFAULT_NUM_PROCESSES = int(os.environ.get("PICKWISE_CAPTION_PROCESSES", 1))
+DEFAULT_DECODE_WORKERS = min(8, os.cpu_count() or 1)
+
+# Number of decoded batches kept ahead of the model
+PREFETCH_BATCHES = 2
+
+
+def configure_torch_threads(num_threads=None):
+    """
+    Let torch use every available core for intra-op parallelism.
+    """
+    import torch
+    num_threads = num_threads or os.cpu_count() or 1
+    torch.set_num_threads(num_threads)
+    return num_threads
+
+
+def decode_image(image_file) -> Image.Image:
+    """
+    Open and fully decode an image (path, file object, raw bytes or an
+    already-decoded PIL image) as RGB.
+    """
+    if isinstance(image_file, Image.Image):
+        return image_file if image_file.mode == "RGB" else image_file.convert("RGB")
+    if isinstance(image_file, (bytes, bytearray)):
+        from io import BytesIO
+        image_file = BytesIO(image_file)
+    image = Image.open(image_file)
+    return image.convert("RGB")
+
+
+def _safe_decode(image_file):
+    try:
+        with timer("image.decode"):
+            return decode_image(image_file), None
+    except Exception as e:
+        count("image.decode_errors")
+        return None, e
+
+
+def caption_batch(images, processor, model, generate_kwargs=None) -> list:
+    """
+    Caption a micro-batch of PIL images with a single generate() call.
+    """
+    import torch
+    # Casts pixel values only, so bf16 models get bf16 inputs
+    inputs = processor(images=images, return_tensors="pt").to(model.dtype)
+    with torch.no_grad(), timer("blip.generate", items=len(images)):
+        out = model.generate(**inputs, **(generate_kwargs or {}))
+    return processor.batch_decode(out, skip_special_tokens=True)
+
+
+def map_image_batches(image_files, batch_fn, batch_size=DEFAULT_BATCH_SIZE,
+                      decode_workers=DEFAULT_DECODE_WORKERS, lookup=None):
+    """
+    Decode images on a thread pool and feed them to batch_fn in micro-batches.
+
+    batch_fn takes a list of PIL images and returns one result per image.
+    Returns (results, errors) aligned with image_files, as caption_images does.
+    """
+    image_files = list(image_files)
+    batch_size = max(1, int(batch_size))
+    results = [None] * len(image_files)
+    errors = {}
+    indexed = list(enumerate(image_files))
+    batches = [indexed[i:i + batch_size] for i in range(0, len(indexed), batch_size)]
+
+    with ThreadPoolExecutor(max_workers=decode_workers) as pool:
+        pending = deque()
+
+        def submit_next():
+            if batches:
+                batch = batches.pop(0)
+                pending.append([(idx, pool.submit(_safe_decode, f)) for idx, f in batch])
+
+        # Keep a few batches decoding while the model works on the current one
+        for _ in range(PREFETCH_BATCHES):
+            submit_next()
+
+        while pending:
+            batch = pending.popleft()
+            submit_next()
+
+            indices, images = [], []
+            for idx, future in batch:
+                image, error = future.result()
+                if error is not None:
+                    errors[idx] = error
+                    continue
+                cached = lookup(idx, image) if lookup is not None else None
+                if cached is not None:
+                    results[idx] = cached
+                else:
+                    indices.append(idx)
+                    images.append(image)
+
+            if not images:
+                continue
+            try:
+                batch_results = batch_fn(images)
+            except Exception as e:
+                for idx in indices:
+                    errors[idx] = e
+                continue
+            for idx, result in zip(indices, batch_results):
+                results[idx] = result
+
+    return results, errors
+
+
+def _caption_in_process(image_files, processor, model, batch_size, decode_workers, generate_kwargs,
+                        lookup=None):
+    def batch_fn(images):
+        return caption_batch(images, processor, model, generate_kwargs)
+    return map_image_batches(image_files, batch_fn, batch_size, decode_workers, lookup)
+
+
+# Per-process model, loaded once by the pool initializer
+_worker_processor = None
+_worker_model = None
+
+
+def _init_worker(model_name, num_threads, profile=None):
+    global _worker_processor, _worker_model
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    configure_torch_threads(num_threads)
+    _worker_processor = BlipProcessor.from_pretrained(model_name)
+    _worker_model = BlipForConditionalGeneration.from_pretrained(model_name)
+    if profile not in (None, "fp32"):
+        from inference_profiles import apply_profile
+        _worker_model = apply_profile(_worker_model, profile)
+    _worker_model.eval()
+
+
+def _caption_shard(shard, batch_size, decode_workers, generate_kwargs):
+    captions, errors = _caption_in_process(shard, _worker_processor, _worker_model,
+                                           batch_size, decode_workers, generate_kwargs)
+    # Exceptions may not pickle cleanly across processes
+    return captions, {idx: repr(e) for idx, e in errors.items()}
+
+
+def _to_picklable(image_file):
+    # Decoded PIL images pickle as they are
+    if isinstance(image_file, (str, bytes, os.PathLike, Image.Image)):
+        return image_file
+    if hasattr(image_file, "seek"):
+        image_file.seek(0)
+    data = image_file.read()
+    if hasattr(image_file, "seek"):
+        image_file.seek(0)
+    return data
+
+
+def caption_images(image_files, processor=None, model=None, batch_size=DEFAULT_BATCH_SIZE,
+                   num_processes=DEFAULT_NUM_PROCESSES, decode_workers=DEFAULT_DECODE_WORKERS,
+                   num_threads=None, model_name=BLIP_MODEL_NAME, generate_kwargs=None, lookup=None,
+                   profile=None):
+    """
+    Caption images in micro-batches, decoding on a thread pool ahead of the model.
+
+    Returns (captions, errors): captions is aligned with image_files (None where an
+    image failed) and errors maps the failed index to its exception.
+    With num_processes > 1 the list is sharded across worker processes, each
+    loading its own copy of model_name and splitting the cores between them.
+    lookup(index, image) is called on every decoded image; returning a caption
+    skips inference for it (used for cache hits).
+    profile is the inference profile worker processes convert their model to;
+    in-process callers pass an already converted model.
+    """
+    image_files = list(image_files)
+    batch_size = max(1, int(batch_size))
+    if not image_files:
+        return [], {}
+
+    if num_processes <= 1:
+        if processor is None or model is None:
+            raise ValueError("processor and model are required when num_processes <= 1")
+        configure_torch_threads(num_threads)
+        return _caption_in_process(image_files, processor, model, batch_size,
+                                   decode_workers, generate_kwargs, lookup)
+
+    captions = [None] * len(image_files)
+    errors = {}
+    pending = list(range(len(image_files)))
+    if lookup is not None:
+        # Resolve hits in the parent so only misses are shipped to workers
+        pending = []
+        with ThreadPoolExecutor(max_workers=decode_workers) as pool:
+            for idx, (image, error) in enumerate(pool.map(_safe_decode, image_files)):
+                if error is not None:
+                    errors[idx] = error
+                    continue
+                cached = lookup(idx, image)
+                if cached is not None:
+                    captions[idx] = cached
+                else:
+                    pending.append(idx)
+        if not pending:
+            return captions, errors
+
+    num_processes = min(num_processes, len(pending))
+    threads_per_process = max(1, (num_threads or os.cpu_count() or 1) // num_processes)
+    payload = [_to_picklable(image_files[idx]) for idx in pending]
+    shard_size = -(-len(payload) // num_processes)
+    shards = [payload[i:i + shard_size] for i in range(0, len(payload), shard_size)]
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=num_processes, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(model_name, threads_per_process, profile)) as pool:
+        futures = [pool.submit(_caption_shard, shard, batch_size,
+                               max(1, decode_workers // num_processes), generate_kwargs)
+                   for shard in shards]
+        for offset, future in zip(range(0, len(payload), shard_size), futures):
+            shard_captions, shard_errors = future.result()
+            for pos, caption in enumerate(shard_captions, start=offset):
+                captions[pending[pos]] = caption
+            for pos, message in shard_errors.items():
+                errors[pending[offset + pos]] = RuntimeError(message)
+
+    return captions, errors
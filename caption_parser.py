@@ -0,0 +1,90 @@
+from instrumentation import timer
+
+categories = ['Color', 'Material', 'Style', 'SleeveType', 'Neckline', 'Pattern']
+
+attribute_keywords = {
+    'Color': ["red", "blue", "green", "yellow", "black", "white", "pink", "purple", "orange", "beige", "brown", "grey"],
+    'Material': ["cotton", "denim", "linen", "leather", "silk", "wool", "polyester"],
+    'Style': ["casual", "formal", "boho", "elegant", "sporty", "classic"],
+    'SleeveType': ["sleeveless", "short sleeve", "long sleeve", "cap sleeve", "three-quarter sleeve"],
+    'Neckline': ["v-neck", "round neck", "boat neck", "collared", "square neck"],
+    'Pattern': ["solid", "floral", "striped", "checked", "polka dot", "printed"]
+}
+
+# Tokenizer-only pipeline and phrase matcher, built on first use
+_nlp = None
+_matcher = None
+
+
+def _keyword_variants(keyword):
+    # Captions write "v neck", "short-sleeve", "short sleeves" interchangeably
+    variants = {keyword, keyword.replace("-", " "), keyword.replace(" ", "-")}
+    return variants | {v + "s" for v in variants if not v.endswith("s")}
+
+
+def get_matcher():
+    """
+    Return the shared (nlp, matcher) pair covering every attribute keyword.
+    """
+    global _nlp, _matcher
+    if _matcher is None:
+        # Imported here so the keyword tables load without pulling in spaCy
+        import spacy
+        from spacy.matcher import PhraseMatcher
+        nlp = spacy.blank("en")
+        matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+        for attr, keywords in attribute_keywords.items():
+            for keyword in keywords:
+                patterns = [nlp.make_doc(v) for v in sorted(_keyword_variants(keyword))]
+                matcher.add(f"{attr}|{keyword}", patterns)
+        _nlp, _matcher = nlp, matcher
+    return _nlp, _matcher
+
+
+def _doc_matches(doc) -> list:
+    # (category, keyword) for every match, in caption order
+    nlp, matcher = get_matcher()
+    return [tuple(nlp.vocab.strings[match_id].split("|", 1))
+            for match_id, start, end in sorted(matcher(doc), key=lambda m: (m[1], m[2]))]
+
+
+def attributes_from_matches(matches) -> dict:
+    attributes = {cat: "Unknown" for cat in categories}
+
+    # Later mentions win, as with the original token scan
+    for attr, keyword in matches:
+        attributes[attr] = keyword.capitalize()
+
+    return attributes
+
+
+def _attributes_from_doc(doc) -> dict:
+    return attributes_from_matches(_doc_matches(doc))
+
+
+# Parse attributes from caption using the compiled phrase matcher
+def parse_attributes_from_caption(caption: str) -> dict:
+    nlp, _ = get_matcher()
+    with timer("spacy.parse"):
+        return _attributes_from_doc(nlp.make_doc(caption))
+
+
+def parse_many(captions, batch_size: int = 256) -> list:
+    """
+    Parse a batch of captions in one streamed nlp.pipe pass.
+    """
+    nlp, _ = get_matcher()
+    captions = list(captions)
+    with timer("spacy.parse", items=len(captions)):
+        return [_attributes_from_doc(doc) for doc in nlp.pipe(captions, batch_size=batch_size)]
+
+
+def match_many(captions, batch_size: int = 256) -> list:
+    """
+    Every (category, keyword) match per caption, in caption order, for
+    callers that need all mentions rather than one value per category.
+    """
+    nlp, _ = get_matcher()
+    captions = list(captions)
+    with timer("spacy.parse", items=len(captions)):
+        return [_doc_matches(doc) for doc in nlp.pipe(captions, batch_size=batch_size)]
@@ -0,0 +1,118 @@
+import weakref
+import numpy as np
+from caption_parser import categories, attribute_keywords
+from instrumentation import timer
+
+# One prompt per category so each label is scored in garment context
+PROMPT_TEMPLATES = {
+    'Color': "a photo of a {} garment",
+    'Material': "a photo of a garment made of {}",
+    'Style': "a photo of a {} outfit",
+    'SleeveType': "a photo of a {} top",
+    'Neckline': "a photo of a top with a {}",
+    'Pattern': "a photo of a {} fabric",
+}
+
+# Text-embedding banks, computed once per loaded model and dropped with it
+_text_banks = weakref.WeakKeyDictionary()
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def get_text_bank(processor, model) -> dict:
+    """
+    Return the normalized text-embedding bank for every attribute keyword.
+
+    The bank holds one stacked float32 matrix (labels x dim), the label list and
+    a slice per category into it.
+    """
+    bank = _text_banks.get(model)
+    if bank is not None:
+        return bank
+
+    labels, slices, prompts = [], {}, []
+    for cat in categories:
+        keywords = attribute_keywords[cat]
+        slices[cat] = slice(len(labels), len(labels) + len(keywords))
+        labels.extend(keywords)
+        template = PROMPT_TEMPLATES.get(cat, "a photo of {}")
+        prompts.extend(template.format(keyword) for keyword in keywords)
+
+    import torch
+    inputs = processor(text=prompts, return_tensors="pt", padding=True)
+    with torch.no_grad():
+        text_features = model.get_text_features(**inputs)
+    matrix = _normalize_rows(text_features.float().cpu().numpy())
+
+    bank = {"matrix": matrix, "labels": labels, "slices": slices,
+            "logit_scale": float(model.logit_scale.exp().item())}
+    _text_banks[model] = bank
+    return bank
+
+
+def embed_images(images, processor, model) -> np.ndarray:
+    """
+    Encode a batch of PIL images into L2-normalized float32 CLIP embeddings.
+    """
+    import torch
+    inputs = processor(images=images, return_tensors="pt").to(model.dtype)
+    with torch.no_grad(), timer("clip.embed", items=len(images)):
+        image_features = model.get_image_features(**inputs)
+    return _normalize_rows(image_features.float().cpu().numpy())
+
+
+def score_embeddings(embeddings: np.ndarray, bank: dict) -> np.ndarray:
+    """
+    Label probabilities (images x labels, float32), softmaxed within each
+    category, from a single matrix multiply against the text bank.
+    """
+    logits = bank["logit_scale"] * (embeddings @ bank["matrix"].T)
+    probs = np.empty_like(logits, dtype=np.float32)
+    for cat in categories:
+        cat_logits = logits[:, bank["slices"][cat]]
+        cat_probs = np.exp(cat_logits - cat_logits.max(axis=1, keepdims=True))
+        probs[:, bank["slices"][cat]] = cat_probs / cat_probs.sum(axis=1, keepdims=True)
+    return probs
+
+
+def classify_embeddings(embeddings: np.ndarray, bank: dict, min_confidence: float = 0.0) -> list:
+    """
+    Zero-shot attribute labels for a batch of normalized image embeddings.
+
+    Each category takes its softmax argmax, falling back to "Unknown" below
+    min_confidence.
+    """
+    all_probs = score_embeddings(embeddings, bank)
+    labels = bank["labels"]
+    results = [{} for _ in range(len(embeddings))]
+
+    for cat in categories:
+        probs = all_probs[:, bank["slices"][cat]]
+        best = probs.argmax(axis=1)
+        offset = bank["slices"][cat].start
+        for row, col in enumerate(best):
+            if probs[row, col] >= min_confidence:
+                results[row][cat] = labels[offset + col].capitalize()
+            else:
+                results[row][cat] = "Unknown"
+
+    return results
+
+
+def clip_attributes(images, processor, model, min_confidence: float = 0.0) -> list:
+    """
+    Attribute dicts for a batch of PIL images from one CLIP forward pass.
+    """
+    bank = get_text_bank(processor, model)
+    return classify_embeddings(embed_images(images, processor, model), bank, min_confidence)
+
+
+def clip_scores(images, processor, model) -> np.ndarray:
+    """
+    Per-label probabilities for a batch of PIL images from one CLIP forward pass.
+    """
+    bank = get_text_bank(processor, model)
+    return score_embeddings(embed_images(images, processor, model), bank)
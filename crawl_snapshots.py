@@ -0,0 +1,91 @@
+import hashlib
+import os
+import re
+from datetime import datetime
+import pandas as pd
+from scraper import scrape_all_sources
+from storage import to_categorical
+
+DEFAULT_SNAPSHOT_DIR = os.path.join("output", "snapshots")
+
+# Columns whose change marks a product as updated
+FINGERPRINT_COLUMNS = ["name", "image_url"]
+
+
+def snapshot_path(brand, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    slug = re.sub(r"[^a-z0-9]+", "_", brand.lower()).strip("_")
+    return os.path.join(snapshot_dir, f"{slug}.parquet")
+
+
+def content_fingerprint(df):
+    """
+    Per-row hash of the product content, independent of its URL.
+    """
+    columns = [c for c in FINGERPRINT_COLUMNS if c in df]
+    joined = df[columns].astype(str).agg("\x1f".join, axis=1) if columns else pd.Series("", index=df.index)
+    return joined.map(lambda text: hashlib.sha1(text.encode()).hexdigest())
+
+
+def load_snapshot(brand, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    path = snapshot_path(brand, snapshot_dir)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["url", "fingerprint", "first_seen", "last_seen", "active"])
+    return pd.read_parquet(path)
+
+
+def update_snapshot(brand, crawled, snapshot_dir=DEFAULT_SNAPSHOT_DIR, crawl_time=None):
+    """
+    Merge a fresh crawl into the brand snapshot (keyed by product URL) and
+    return the delta as {"new": df, "changed": df, "removed": df}.
+
+    The snapshot keeps every product ever seen with first_seen/last_seen
+    timestamps, its content fingerprint and whether it is still listed.
+    Relisted products count as changed.
+    """
+    crawl_time = pd.Timestamp(crawl_time or datetime.now())
+    previous = load_snapshot(brand, snapshot_dir).set_index("url")
+
+    current = crawled.dropna(subset=["url"]).drop_duplicates(subset="url").copy()
+    current["fingerprint"] = content_fingerprint(current)
+    current = current.set_index("url")
+
+    seen_before = current.index.isin(previous.index)
+    new = current[~seen_before]
+    was_listed = previous.reindex(current.index[seen_before])
+    changed_mask = (was_listed["fingerprint"] != current.loc[seen_before, "fingerprint"]) | ~was_listed["active"].astype(bool)
+    changed = current[seen_before][changed_mask.to_numpy()]
+    removed = previous[previous["active"].astype(bool) & ~previous.index.isin(current.index)]
+
+    current["first_seen"] = previous["first_seen"].reindex(current.index).fillna(crawl_time)
+    current["last_seen"] = crawl_time
+    current["active"] = True
+    gone = previous[~previous.index.isin(current.index)].copy()
+    gone["active"] = False
+    snapshot = pd.concat([current, gone]).reset_index()
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    to_categorical(snapshot).to_parquet(snapshot_path(brand, snapshot_dir), index=False)
+
+    return {
+        "new": new.reset_index(),
+        "changed": changed.reset_index(),
+        "removed": removed.reset_index(),
+    }
+
+
+def incremental_crawl(url_list, snapshot_dir=DEFAULT_SNAPSHOT_DIR, **scrape_kwargs):
+    """
+    Crawl all sources and return only what moved since the last run:
+    {brand: {"new": df, "changed": df, "removed": df}}.
+
+    Brands whose crawl came back empty are left untouched rather than marking
+    their whole catalogue as removed.
+    """
+    crawl_time = datetime.now()
+    deltas = {}
+    for brand, df in scrape_all_sources(url_list, **scrape_kwargs).items():
+        if df.empty:
+            print(f"Empty crawl for {brand}; snapshot left unchanged")
+            continue
+        deltas[brand] = update_snapshot(brand, df, snapshot_dir, crawl_time)
+    return deltas
@@ -0,0 +1,145 @@
+import json
+import os
+import sqlite3
+import numpy as np
+
+DEFAULT_STORE_DIR = os.path.join(".pickwise_cache", "embeddings")
+
+
+class EmbeddingStore:
+    """
+    Append-only image-embedding store.
+
+    Vectors live in a raw float16/float32 file exposed as a read-only
+    np.memmap (no copies, nothing held as Python floats); a SQLite index maps
+    each row to its product URL, image hash and JSON metadata.
+    """
+
+    def __init__(self, directory=DEFAULT_STORE_DIR, dim=None, dtype="float16"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._vectors_path = os.path.join(directory, "vectors.bin")
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if dim is not None and dim != meta["dim"]:
+                raise ValueError(f"Store at {directory} has dim {meta['dim']}, not {dim}")
+            dim, dtype = meta["dim"], meta["dtype"]
+        elif dim is None:
+            raise ValueError("dim is required when creating a new embedding store")
+        else:
+            with open(self._meta_path, "w") as f:
+                json.dump({"dim": int(dim), "dtype": np.dtype(dtype).name}, f)
+
+        self.dim = int(dim)
+        self.dtype = np.dtype(dtype)
+        self._view = None
+
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS items (
+                row INTEGER PRIMARY KEY,
+                url TEXT,
+                image_hash TEXT,
+                metadata TEXT
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_items_url ON items(url)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_items_hash ON items(image_hash)")
+        self._conn.commit()
+
+        # Drop vector rows written without a matching index entry (interrupted append)
+        indexed = self._conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        if self._file_rows() > indexed:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(indexed * self.dim * self.dtype.itemsize)
+
+    def _file_rows(self):
+        if not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (self.dim * self.dtype.itemsize)
+
+    def __len__(self):
+        return self._file_rows()
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """
+        Zero-copy (rows x dim) view over every stored vector.
+        """
+        rows = self._file_rows()
+        if self._view is None or self._view.shape[0] != rows:
+            if rows == 0:
+                self._view = np.empty((0, self.dim), dtype=self.dtype)
+            else:
+                self._view = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+        return self._view
+
+    def append(self, vectors, urls=None, image_hashes=None, metadata=None) -> np.ndarray:
+        """
+        Append vectors with their optional URLs, image hashes and metadata dicts.
+        Returns the row ids assigned to them.
+        """
+        vectors = np.asarray(vectors, dtype=self.dtype).reshape(-1, self.dim)
+        n = len(vectors)
+        urls = list(urls) if urls is not None else [None] * n
+        image_hashes = list(image_hashes) if image_hashes is not None else [None] * n
+        metadata = list(metadata) if metadata is not None else [None] * n
+        if not (len(urls) == len(image_hashes) == len(metadata) == n):
+            raise ValueError("urls, image_hashes and metadata must match the number of vectors")
+
+        start = self._file_rows()
+        with open(self._vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors).tobytes())
+        rows = np.arange(start, start + n)
+        self._conn.executemany(
+            "INSERT INTO items VALUES (?, ?, ?, ?)",
+            [(int(row), url, h, json.dumps(meta) if meta is not None else None)
+             for row, url, h, meta in zip(rows, urls, image_hashes, metadata)],
+        )
+        self._conn.commit()
+        return rows
+
+    def lookup(self, keys, by="url") -> np.ndarray:
+        """
+        Row ids for a list of URLs or image hashes (by="image_hash"); -1 where missing.
+        The most recent row wins when a key was appended more than once.
+        """
+        if by not in ("url", "image_hash"):
+            raise ValueError("by must be 'url' or 'image_hash'")
+        keys = list(keys)
+        found = {}
+        # Chunk to stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 900):
+            chunk = keys[i:i + 900]
+            placeholders = ",".join("?" * len(chunk))
+            query = f"SELECT {by}, MAX(row) FROM items WHERE {by} IN ({placeholders}) GROUP BY {by}"
+            found.update(self._conn.execute(query, chunk).fetchall())
+        return np.array([found.get(k, -1) for k in keys], dtype=np.int64)
+
+    def get(self, keys, by="url") -> np.ndarray:
+        """
+        Vectors for the given keys, NaN rows where a key is missing.
+        """
+        rows = self.lookup(keys, by=by)
+        out = np.full((len(rows), self.dim), np.nan, dtype=self.dtype)
+        present = rows >= 0
+        out[present] = self.vectors[rows[present]]
+        return out
+
+    def metadata(self, rows) -> list:
+        rows = [int(r) for r in rows]
+        found = {}
+        for i in range(0, len(rows), 900):
+            chunk = rows[i:i + 900]
+            placeholders = ",".join("?" * len(chunk))
+            query = f"SELECT row, url, image_hash, metadata FROM items WHERE row IN ({placeholders})"
+            for row, url, h, meta in self._conn.execute(query, chunk):
+                found[row] = {"url": url, "image_hash": h, **(json.loads(meta) if meta else {})}
+        return [found.get(r) for r in rows]
+
+    def close(self):
+        self._view = None
+        self._conn.close()
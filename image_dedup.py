@@ -0,0 +1,206 @@
+"""
+Perceptual-hash near-duplicate detection for product images.
+
+Images are reduced to small grayscale grids once and hashed in NumPy
+batches. aHash and dHash compare pixels with the mean or with their
+neighbour. pHash thresholds the low-frequency block of a 2-D DCT. Each
+hash is 64 bits, stored as uint64.
+
+NearDuplicateIndex groups hashes within max_distance bits (Hamming) using
+a BK-tree, so each lookup only visits the tree branches the triangle
+inequality allows. A coarse mean-colour check keeps colourways apart:
+grayscale hashes cannot tell a red dress from the same dress in blue, but
+their attributes differ.
+"""
+import numpy as np
+from PIL import Image
+from instrumentation import timer, count
+
+HASH_SIZE = 8
+PHASH_SIZE = 32
+DEFAULT_METHOD = "phash"
+DEFAULT_MAX_DISTANCE = 6
+# Largest per-channel difference of mean colour (0-255) still treated as the same item
+DEFAULT_COLOR_TOLERANCE = 24
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _open_small(image, size):
+    # Decode at reduced scale where the format allows it (JPEG draft)
+    if isinstance(image, Image.Image):
+        return image.convert("RGB")
+    # Uploaded file objects are read again by the extractor, so rewind them
+    position = image.tell() if hasattr(image, "tell") else None
+    try:
+        decoded = Image.open(image)
+        decoded.draft("RGB", size)
+        return decoded.convert("RGB")
+    finally:
+        if position is not None:
+            image.seek(position)
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def _pack(bits):
+    # (n, 64) booleans -> (n,) uint64, most significant bit first
+    return np.packbits(bits.reshape(len(bits), -1), axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def _grids(images, size):
+    return np.stack([np.asarray(image.convert("L").resize(size, Image.BOX), dtype=np.float32)
+                     for image in images]) if images else np.zeros((0, size[1], size[0]), np.float32)
+
+
+def average_hash(grids):
+    return _pack(grids > grids.mean(axis=(1, 2), keepdims=True))
+
+
+def difference_hash(grids):
+    return _pack(grids[:, :, 1:] > grids[:, :, :-1])
+
+
+def perceptual_hash(grids):
+    coefficients = np.einsum("ij,njk,lk->nil", _DCT, grids, _DCT)[:, :HASH_SIZE, :HASH_SIZE]
+    flat = coefficients.reshape(len(grids), -1)
+    # The DC term only tracks brightness, so it is left out of the median
+    median = np.median(flat[:, 1:], axis=1, keepdims=True)
+    return _pack(flat > median)
+
+
+def image_hashes(images, method=DEFAULT_METHOD):
+    """
+    (hashes, mean_colors) for a batch of PIL images or paths/file objects:
+    uint64 perceptual hashes of the chosen method and (n, 3) mean RGB.
+    Images that cannot be decoded get a NaN colour, which never matches, so
+    they stay in clusters of their own and fail later where they are extracted.
+    """
+    small, failed = [], []
+    for idx, image in enumerate(images):
+        try:
+            small.append(_open_small(image, (PHASH_SIZE, PHASH_SIZE)))
+        except Exception:
+            small.append(Image.new("RGB", (PHASH_SIZE, PHASH_SIZE)))
+            failed.append(idx)
+    colors = np.array([np.asarray(image.resize((4, 4), Image.BOX), dtype=np.float32).mean(axis=(0, 1))
+                       for image in small]).reshape(len(small), 3)
+    colors[failed] = np.nan
+    if method == "ahash":
+        hashes = average_hash(_grids(small, (HASH_SIZE, HASH_SIZE)))
+    elif method == "dhash":
+        hashes = difference_hash(_grids(small, (HASH_SIZE + 1, HASH_SIZE)))
+    elif method == "phash":
+        hashes = perceptual_hash(_grids(small, (PHASH_SIZE, PHASH_SIZE)))
+    else:
+        raise ValueError(f"Unknown hash method {method!r}; use ahash, dhash or phash")
+    return hashes, colors
+
+
+def hamming_distance(a, b):
+    """
+    Bit distance between uint64 hashes (broadcasting).
+    """
+    xor = np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64))
+    return _POPCOUNT[np.atleast_1d(xor).view(np.uint8)].reshape(np.shape(xor) + (8,)).sum(axis=-1)
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes under Hamming distance.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        value = int(value)
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            distance = bin(node[0] ^ value).count("1")
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+
+    def query(self, value, radius):
+        """
+        Items whose hash lies within radius bits of value, as (distance, item).
+        """
+        value = int(value)
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = bin(node[0] ^ value).count("1")
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+class NearDuplicateIndex:
+    """
+    Incremental near-duplicate clustering: assign() maps every new image to
+    the representative of an existing cluster within max_distance bits and
+    color_tolerance, or makes it the representative of a new cluster.
+    Representatives are the first member seen, so earlier batches never move.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, color_tolerance=DEFAULT_COLOR_TOLERANCE):
+        self.max_distance = max_distance
+        self.color_tolerance = color_tolerance
+        self.tree = BKTree()
+        self.colors = []
+
+    def assign(self, hashes, colors) -> np.ndarray:
+        """
+        Representative id for each row; ids count every image ever assigned.
+        """
+        representatives = np.empty(len(hashes), dtype=np.int64)
+        for row, (value, color) in enumerate(zip(hashes, colors)):
+            item = len(self.colors)
+            self.colors.append(np.asarray(color, dtype=np.float32))
+            match = None
+            for distance, other in sorted(self.tree.query(value, self.max_distance)):
+                if np.abs(self.colors[other] - self.colors[item]).max() <= self.color_tolerance:
+                    match = other
+                    break
+            if match is None:
+                # Only representatives go into the tree, so clusters do not chain
+                self.tree.add(value, item)
+                representatives[row] = item
+            else:
+                representatives[row] = match
+        return representatives
+
+
+def cluster_images(images, method=DEFAULT_METHOD, max_distance=DEFAULT_MAX_DISTANCE,
+                   color_tolerance=DEFAULT_COLOR_TOLERANCE) -> np.ndarray:
+    """
+    Near-duplicate cluster label of each image: the index of its representative.
+    """
+    images = list(images)
+    with timer("image.phash", items=len(images)):
+        hashes, colors = image_hashes(images, method)
+    with timer("image.cluster", items=len(images)):
+        representatives = NearDuplicateIndex(max_distance, color_tolerance).assign(hashes, colors)
+    count("image.near_duplicates", int((representatives != np.arange(len(images))).sum()))
+    return representatives
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from io import BytesIO
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PIL import Image
+
+# BLIP Large works at 384px; CLIP ViT-B/32 at 224px
+DEFAULT_TARGET_SIZE = (384, 384)
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_TIMEOUT = 15
+
+
+def downscale_for_model(data: bytes, target_size=DEFAULT_TARGET_SIZE) -> Image.Image:
+    """
+    Decode image bytes straight to roughly model resolution.
+
+    JPEGs are decoded at a reduced DCT scale via draft(), so full-size
+    originals are never materialized; the result still covers target_size
+    on both axes because model processors resize to a square.
+    """
+    image = Image.open(BytesIO(data))
+    width, height = image.size
+    scale = max(target_size[0] / width, target_size[1] / height)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image.draft("RGB", size)
+        image = image.convert("RGB")
+        if image.size != size:
+            image = image.resize(size, Image.BILINEAR)
+        return image
+    return image.convert("RGB")
+
+
+class ImageFetcher:
+    """
+    Concurrent product-image downloader with retries and two-level dedup.
+
+    Each distinct URL is fetched once and each distinct payload (by SHA-256
+    of the bytes) is decoded and yielded once; url_to_hash records which
+    content every URL resolved to so results can be fanned back out to rows.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, retries=3, timeout=DEFAULT_TIMEOUT,
+                 target_size=DEFAULT_TARGET_SIZE):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.target_size = target_size
+        self.url_to_hash = {}
+        self.failed = {}
+
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._seen_hashes = set()
+        self._lock = threading.Lock()
+
+    def _fetch(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.content
+        content_hash = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if content_hash in self._seen_hashes:
+                return content_hash, None
+        # A payload only counts as seen once it decodes; failures stay failures
+        # for every URL serving the same bytes
+        image = downscale_for_model(data, self.target_size)
+        with self._lock:
+            if content_hash in self._seen_hashes:
+                return content_hash, None
+            self._seen_hashes.add(content_hash)
+        return content_hash, image
+
+    def iter_images(self, urls):
+        """
+        Yield (content_hash, image) for every distinct image behind urls, in
+        completion order, with at most 2 x max_workers downloads in flight.
+        """
+        pending_urls = iter(dict.fromkeys(u for u in urls if isinstance(u, str) and u))
+        in_flight = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            def fill():
+                while len(in_flight) < 2 * self.max_workers:
+                    url = next(pending_urls, None)
+                    if url is None:
+                        return
+                    if url in self.url_to_hash:
+                        continue
+                    in_flight[pool.submit(self._fetch, url)] = url
+
+            fill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = in_flight.pop(future)
+                    try:
+                        content_hash, image = future.result()
+                    except Exception as e:
+                        self.failed[url] = e
+                        continue
+                    self.url_to_hash[url] = content_hash
+                    if image is not None:
+                        yield content_hash, image
+                fill()
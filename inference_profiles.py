@@ -0,0 +1,189 @@
+"""
+CPU inference profiles for the BLIP and CLIP models.
+
+A profile bundles a weight format (fp32, dynamic int8, bf16), optional
+torch.compile of the vision encoder and the caption generation settings.
+compare_profiles() measures each profile's speed and how often it extracts
+the same attributes as the fp32 baseline on a sample set.
+
+    python inference_profiles.py samples/ --profiles int8,bf16,fast
+"""
+import argparse
+import os
+import time
+from dataclasses import dataclass, field
+import pandas as pd
+
+DEFAULT_PROFILE = os.environ.get("PICKWISE_INFERENCE_PROFILE", "fp32")
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    """
+    quantize applies dynamic int8 quantization to every nn.Linear; dtype
+    "bfloat16" casts the weights (ignored on CPUs without native bf16);
+    compile runs the vision encoder through torch.compile. generate_kwargs
+    are passed to BLIP's generate() and have no effect on CLIP.
+    """
+    name: str
+    quantize: bool = False
+    dtype: str = "float32"
+    compile: bool = False
+    generate_kwargs: dict = field(default_factory=dict)
+
+
+PROFILES = {}
+
+
+def register_profile(profile):
+    PROFILES[profile.name] = profile
+    return profile
+
+
+register_profile(InferenceProfile(name="fp32"))
+register_profile(InferenceProfile(name="int8", quantize=True))
+register_profile(InferenceProfile(name="bf16", dtype="bfloat16"))
+register_profile(InferenceProfile(name="compiled", compile=True))
+register_profile(InferenceProfile(
+    name="fast", quantize=True,
+    generate_kwargs={"num_beams": 1, "max_new_tokens": 16},
+))
+register_profile(InferenceProfile(
+    name="quality",
+    generate_kwargs={"num_beams": 3, "max_new_tokens": 30},
+))
+
+
+def get_profile(profile=None) -> InferenceProfile:
+    if isinstance(profile, InferenceProfile):
+        return profile
+    name = profile or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown inference profile {name!r}; choose from {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+def cpu_supports_bf16() -> bool:
+    """
+    True when the CPU has native bf16 instructions (AVX512-BF16 or AMX);
+    elsewhere bf16 is emulated and slower than fp32.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def apply_profile(model, profile):
+    """
+    Return model converted for profile. The input model may be modified.
+    """
+    import torch
+    profile = get_profile(profile)
+
+    if profile.quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif profile.dtype == "bfloat16":
+        if cpu_supports_bf16():
+            model = model.to(torch.bfloat16)
+        else:
+            print(f"Profile {profile.name}: CPU has no native bf16 support, keeping fp32 weights")
+
+    if profile.compile:
+        # Only the fixed-shape vision encoder; the text decoder sees a new
+        # sequence length every generation step and would keep recompiling
+        if hasattr(model, "vision_model"):
+            model.vision_model = torch.compile(model.vision_model)
+        else:
+            print(f"Profile {profile.name}: model has no vision_model, skipping torch.compile")
+
+    model.eval()
+    return model
+
+
+def attribute_agreement(baseline: pd.DataFrame, candidate: pd.DataFrame, on: str = "image_path") -> dict:
+    """
+    Share of images for which candidate extracted the same value as baseline,
+    per attribute column plus "overall" (mean over columns) and, when both
+    have captions, "caption_exact".
+    """
+    from caption_parser import categories
+    merged = baseline.merge(candidate, on=on, suffixes=("_base", "_cand"))
+    agreement = {}
+    if merged.empty:
+        return agreement
+    for cat in categories:
+        if f"{cat}_base" in merged and f"{cat}_cand" in merged:
+            agreement[cat] = float((merged[f"{cat}_base"] == merged[f"{cat}_cand"]).mean())
+    if agreement:
+        agreement["overall"] = sum(agreement.values()) / len(agreement)
+    if "caption_base" in merged and "caption_cand" in merged:
+        agreement["caption_exact"] = float((merged["caption_base"] == merged["caption_cand"]).mean())
+    return agreement
+
+
+def compare_profiles(image_files, profiles=("int8", "bf16", "compiled", "fast"), baseline="fp32",
+                     mode="caption", batch_size=None, warmup: int = 1) -> pd.DataFrame:
+    """
+    Run extraction with baseline and each profile on image_files and report
+    seconds, images/sec, speedup over baseline and attribute agreement.
+
+    The first `warmup` images are run once per profile before timing so
+    model loading and compilation are not counted. Caching is disabled.
+    """
+    from attribute_extractor import enrich_attributes_from_images
+    from caption_engine import DEFAULT_BATCH_SIZE
+
+    image_files = list(image_files)
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    names = [str(i) for i in range(len(image_files))]
+    rows = []
+    baseline_df = None
+
+    for name in [baseline] + [p for p in profiles if p != baseline]:
+        kwargs = dict(batch_size=batch_size, mode=mode, use_cache=False, skip_errors=True, profile=name)
+        if warmup:
+            enrich_attributes_from_images(image_files[:warmup], names=names[:warmup], **kwargs)
+        start = time.perf_counter()
+        df = enrich_attributes_from_images(image_files, names=names, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        if baseline_df is None:
+            baseline_df, baseline_seconds = df, elapsed
+        row = {"profile": name, "seconds": round(elapsed, 3),
+               "images_per_sec": round(len(df) / elapsed, 2) if elapsed else None,
+               "speedup": round(baseline_seconds / elapsed, 2) if elapsed else None}
+        row.update({k: round(v, 3) for k, v in attribute_agreement(baseline_df, df).items()})
+        rows.append(row)
+        print(f"[{name}] {elapsed:.1f}s, agreement {row.get('overall', float('nan')):.1%}")
+
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare inference profiles against the fp32 baseline.")
+    parser.add_argument("images", help="Directory of sample product images")
+    parser.add_argument("--profiles", default="int8,bf16,compiled,fast",
+                        help=f"Comma-separated subset of {','.join(PROFILES)}")
+    parser.add_argument("--mode", default="caption", choices=["caption", "clip"])
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=50, help="Number of sample images")
+    parser.add_argument("--output", help="Write the comparison table to this CSV")
+    args = parser.parse_args(argv)
+
+    from pipeline import list_images
+    images = list_images(args.images)[:args.limit]
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    for name in profiles:
+        get_profile(name)
+
+    report = compare_profiles(images, profiles, mode=args.mode, batch_size=args.batch_size)
+    print(report.to_string(index=False))
+    if args.output:
+        report.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
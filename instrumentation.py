@@ -0,0 +1,219 @@
+"""
+Lightweight timers, counters and latency histograms for the pipeline.
+
+Disabled by default: timer() then hands back a shared no-op context and
+count() returns after one flag check, so the hooks can stay in hot paths.
+Enable with PICKWISE_METRICS=1 or enable(). When PICKWISE_METRICS_FILE is
+set, metrics are written there on exit (Prometheus text for *.prom,
+JSON otherwise).
+
+    from instrumentation import timer, count
+    with timer("blip.generate", items=len(images)):
+        ...
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = os.environ.get("PICKWISE_METRICS", "").lower() in ("1", "true", "yes")
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_NOOP = nullcontext()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident memory of this process in MB (psutil on Windows, NaN
+    when neither is available).
+    """
+    if resource is None:
+        try:
+            import psutil
+        except ImportError:
+            return float("nan")
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class _Timer:
+    __slots__ = ("name", "items", "start")
+
+    def __init__(self, name, items):
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start, self.items)
+        return False
+
+
+def timer(name, items=1):
+    """
+    Context manager timing one call of stage name, which processed items.
+    """
+    if not _enabled:
+        return _NOOP
+    return _Timer(name, items)
+
+
+def record(name, seconds, items=1):
+    """
+    Add one observation of stage name to its histogram.
+    """
+    rss = peak_rss_mb()
+    with _lock:
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = {"count": 0, "items": 0, "sum": 0.0, "min": seconds, "max": seconds,
+                                     "buckets": [0] * len(BUCKETS), "peak_rss_mb": rss}
+        stage["count"] += 1
+        stage["items"] += items
+        stage["sum"] += seconds
+        stage["min"] = min(stage["min"], seconds)
+        stage["max"] = max(stage["max"], seconds)
+        stage["peak_rss_mb"] = max(stage["peak_rss_mb"], rss)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                stage["buckets"][i] += 1
+                break
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def snapshot() -> dict:
+    """
+    Copy of every stage and counter, with mean latency and throughput added.
+    """
+    with _lock:
+        stages = {name: dict(stage, buckets=list(stage["buckets"])) for name, stage in _stages.items()}
+        counters = dict(_counters)
+    for stage in stages.values():
+        stage["mean"] = stage["sum"] / stage["count"]
+        stage["items_per_sec"] = stage["items"] / stage["sum"] if stage["sum"] else None
+    return {"stages": stages, "counters": counters, "peak_rss_mb": peak_rss_mb()}
+
+
+def _metric_name(name):
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+def to_prometheus(data=None) -> str:
+    """
+    Prometheus text exposition of snapshot(): one histogram per stage plus
+    item totals, stage memory high-water marks and counters.
+    """
+    data = data or snapshot()
+    lines = ["# TYPE pickwise_stage_seconds histogram"]
+    for name, stage in sorted(data["stages"].items()):
+        label = f'stage="{name}"'
+        cumulative = 0
+        for bound, n in zip(BUCKETS, stage["buckets"]):
+            cumulative += n
+            lines.append(f'pickwise_stage_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'pickwise_stage_seconds_bucket{{{label},le="+Inf"}} {stage["count"]}')
+        lines.append(f"pickwise_stage_seconds_sum{{{label}}} {stage['sum']:.6f}")
+        lines.append(f"pickwise_stage_seconds_count{{{label}}} {stage['count']}")
+    lines.append("# TYPE pickwise_stage_items_total counter")
+    for name, stage in sorted(data["stages"].items()):
+        lines.append(f'pickwise_stage_items_total{{stage="{name}"}} {stage["items"]}')
+    lines.append("# TYPE pickwise_stage_peak_rss_megabytes gauge")
+    for name, stage in sorted(data["stages"].items()):
+        lines.append(f'pickwise_stage_peak_rss_megabytes{{stage="{name}"}} {stage["peak_rss_mb"]:.1f}')
+    for name, value in sorted(data["counters"].items()):
+        metric = f"pickwise_{_metric_name(name)}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    lines.append("# TYPE pickwise_peak_rss_megabytes gauge")
+    lines.append(f"pickwise_peak_rss_megabytes {data['peak_rss_mb']:.1f}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    """
+    Write snapshot() to path: Prometheus text for .prom/.txt, else JSON.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    data = snapshot()
+    with open(path, "w") as f:
+        if path.endswith((".prom", ".txt")):
+            f.write(to_prometheus(data))
+        else:
+            json.dump(data, f, indent=2)
+    return path
+
+
+def render_streamlit_panel(title="Diagnostics"):
+    """
+    Per-stage latency, throughput and memory table for the Streamlit app.
+    """
+    import pandas as pd
+    import streamlit as st
+    data = snapshot()
+    with st.expander(title):
+        if not data["stages"]:
+            st.caption("No metrics recorded yet." if _enabled else "Metrics are disabled.")
+            return
+        table = pd.DataFrame([
+            {"stage": name, "calls": s["count"], "items": s["items"], "total_s": round(s["sum"], 3),
+             "mean_ms": round(1000 * s["mean"], 1), "max_ms": round(1000 * s["max"], 1),
+             "items_per_sec": round(s["items_per_sec"], 1) if s["items_per_sec"] else None,
+             "peak_rss_mb": round(s["peak_rss_mb"], 1)}
+            for name, s in sorted(data["stages"].items())
+        ])
+        st.dataframe(table)
+        if data["counters"]:
+            st.json(data["counters"])
+        st.caption(f"Process peak RSS: {data['peak_rss_mb']:.0f} MB")
+
+
+def _write_on_exit():
+    path = os.environ.get("PICKWISE_METRICS_FILE")
+    if path and _enabled and (_stages or _counters):
+        write_metrics(path)
+
+
+atexit.register(_write_on_exit)
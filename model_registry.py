@@ -0,0 +1,85 @@
+import threading
+
+BLIP_MODEL_NAME = "Salesforce/blip-image-captioning-large"
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
+
+# name -> zero-argument loader returning (processor, model); loaded pairs are
+# kept in _models
+_loaders = {}
+_models = {}
+_lock = threading.Lock()
+
+
+def register_model(name, loader):
+    """
+    Register a loader to be called the first time get_model(name) is used.
+    """
+    _loaders[name] = loader
+    for key in [k for k in _models if k == name or k.startswith(name + "@")]:
+        del _models[key]
+
+
+def _key(name, profile):
+    return name if profile in (None, "fp32") else f"{name}@{profile}"
+
+
+def get_model(name, profile=None):
+    """
+    Return the loaded model for name, loading it on first use (thread-safe).
+
+    profile names an inference_profiles profile; each profile is loaded and
+    kept separately, with the unconverted fp32 load under the bare name.
+    """
+    key = _key(name, profile)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        if key not in _models:
+            processor, model = _loaders[name]()
+            if key != name:
+                from inference_profiles import apply_profile
+                model = apply_profile(model, profile)
+            _models[key] = processor, model
+        return _models[key]
+
+
+def is_loaded(name, profile=None) -> bool:
+    return _key(name, profile) in _models
+
+
+def preload(*names, profile=None):
+    """
+    Warm-up step: load the named models (all registered ones by default) now
+    rather than on the first request that needs them.
+    """
+    for name in names or list(_loaders):
+        get_model(name, profile)
+
+
+def _load_blip():
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    processor = BlipProcessor.from_pretrained(BLIP_MODEL_NAME)
+    model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_NAME)
+    model.eval()
+    return processor, model
+
+
+def _load_clip():
+    from transformers import CLIPProcessor, CLIPModel
+    processor = CLIPProcessor.from_pretrained(CLIP_MODEL_NAME)
+    model = CLIPModel.from_pretrained(CLIP_MODEL_NAME)
+    model.eval()
+    return processor, model
+
+
+register_model("blip", _load_blip)
+register_model("clip", _load_clip)
+
+
+def get_blip(profile=None):
+    return get_model("blip", profile)
+
+
+def get_clip(profile=None):
+    return get_model("clip", profile)
@@ -0,0 +1,301 @@
+import heapq
+import numpy as np
+import scipy.sparse as sp
+import joblib
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize as l2_normalize
+
+# Upper bound on the dense similarity tile materialized per query block
+DEFAULT_MAX_BLOCK_BYTES = 256 * 1024 * 1024
+
+
+def _block_rows(n_cols, max_bytes=DEFAULT_MAX_BLOCK_BYTES):
+    return max(1, int(max_bytes // (8 * max(1, n_cols))))
+
+
+def _dense(matrix):
+    return matrix.toarray() if sp.issparse(matrix) else np.asarray(matrix)
+
+
+def _merge_topk(best_sims, best_idx, sims, idx, k):
+    # Keep the k most similar of the running best and a new candidate tile
+    all_sims = np.hstack([best_sims, sims])
+    all_idx = np.hstack([best_idx, idx])
+    if all_sims.shape[1] > k:
+        part = np.argpartition(-all_sims, k - 1, axis=1)[:, :k]
+        all_sims = np.take_along_axis(all_sims, part, axis=1)
+        all_idx = np.take_along_axis(all_idx, part, axis=1)
+    return all_sims, all_idx
+
+
+def _finish(best_sims, best_idx):
+    order = np.argsort(-best_sims, axis=1)
+    sims = np.take_along_axis(best_sims, order, axis=1)
+    idx = np.take_along_axis(best_idx, order, axis=1)
+    # Same convention as sklearn's cosine_distances
+    return np.clip(1.0 - sims, 0.0, 2.0), idx
+
+
+def mean_cosine_distances(X, Y=None, exact_tiles=False, max_block_bytes=DEFAULT_MAX_BLOCK_BYTES):
+    """
+    Row means of cosine_distances(X, Y) without materializing the N x M matrix.
+
+    By default uses the identity mean_j(1 - x_i.y_j) = 1 - x_i.sum_j(y_j) / M on
+    L2-normalized rows, which is linear in N. exact_tiles=True instead
+    evaluates the clipped distances tile by tile within max_block_bytes.
+    As with sklearn, Y=None compares X with itself and zeroes the diagonal.
+    """
+    Xn = l2_normalize(X if sp.issparse(X) else np.asarray(X, dtype=np.float64))
+    Yn = Xn if Y is None else l2_normalize(Y if sp.issparse(Y) else np.asarray(Y, dtype=np.float64))
+    n, m = Xn.shape[0], Yn.shape[0]
+    if m == 0:
+        return np.full(n, np.nan)
+
+    if not exact_tiles:
+        total = np.asarray(Yn.sum(axis=0)).ravel()
+        means = 1.0 - np.asarray(Xn @ total).ravel() / m
+        if Y is None:
+            # All-zero rows sit at distance 1 from themselves unless the diagonal is zeroed
+            zero_rows = np.asarray(abs(Xn).sum(axis=1)).ravel() == 0
+            means[zero_rows] -= 1.0 / m
+        return means
+
+    means = np.empty(n)
+    step = _block_rows(m, max_block_bytes)
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        tile = np.clip(1.0 - _dense(Xn[start:stop] @ Yn.T), 0.0, 2.0)
+        if Y is None:
+            tile[np.arange(stop - start), np.arange(start, stop)] = 0.0
+        means[start:stop] = tile.mean(axis=1)
+    return means
+
+
+class ExactIndex:
+    """
+    Exact cosine k-nearest-neighbour search, brute force in memory-bounded blocks.
+    Works on dense arrays and sparse matrices alike.
+    """
+
+    def __init__(self, max_block_bytes=DEFAULT_MAX_BLOCK_BYTES):
+        self.max_block_bytes = max_block_bytes
+        self.vectors = None
+
+    def __len__(self):
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def build(self, vectors):
+        self.vectors = l2_normalize(vectors if sp.issparse(vectors) else np.asarray(vectors, dtype=np.float64))
+        return self
+
+    def query(self, queries, k=1):
+        """
+        Return (distances, indices), both (n_queries x k), nearest first.
+        """
+        queries = l2_normalize(queries if sp.issparse(queries) else np.asarray(queries, dtype=np.float64))
+        n, m = queries.shape[0], len(self)
+        k = min(k, m)
+        distances = np.empty((n, k))
+        indices = np.empty((n, k), dtype=np.int64)
+        step = _block_rows(m, self.max_block_bytes)
+
+        for start in range(0, n, step):
+            stop = min(n, start + step)
+            sims = _dense(queries[start:stop] @ self.vectors.T)
+            if k == 1:
+                top = sims.argmax(axis=1)[:, None]
+            else:
+                top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            distances[start:stop], indices[start:stop] = _finish(np.take_along_axis(sims, top, axis=1), top)
+
+        return distances, indices
+
+
+class IVFIndex:
+    """
+    Approximate cosine k-NN with an inverted-file (IVF) coarse quantizer.
+
+    Reference vectors are clustered with k-means (on a TruncatedSVD projection
+    when sparse); a query only scans the n_probe closest lists, and candidates
+    are ranked by exact cosine distance on the original vectors.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, n_components=128, random_state=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_components = n_components
+        self.random_state = random_state
+        self.vectors = None
+        self.projection = None
+        self.centroids = None
+        self.lists = []
+
+    def __len__(self):
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def _project(self, vectors):
+        if self.projection is not None:
+            vectors = self.projection.transform(vectors)
+        return l2_normalize(_dense(vectors))
+
+    def build(self, vectors):
+        self.vectors = l2_normalize(vectors if sp.issparse(vectors) else np.asarray(vectors, dtype=np.float64))
+        n, dim = self.vectors.shape
+        if sp.issparse(self.vectors) and dim > self.n_components:
+            self.projection = TruncatedSVD(n_components=self.n_components, random_state=self.random_state)
+            self.projection.fit(self.vectors)
+
+        reduced = self._project(self.vectors)
+        n_lists = self.n_lists or int(np.clip(np.sqrt(n), 1, 4096))
+        n_lists = max(1, min(n_lists, n))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state, n_init=3)
+        assignments = kmeans.fit_predict(reduced)
+        self.centroids = l2_normalize(kmeans.cluster_centers_)
+        self.lists = [np.flatnonzero(assignments == l) for l in range(n_lists)]
+        return self
+
+    def query(self, queries, k=1):
+        """
+        Return (distances, indices), both (n_queries x k), nearest first.
+        Rows with fewer than k candidates are padded with distance 2 and index -1.
+        """
+        queries = l2_normalize(queries if sp.issparse(queries) else np.asarray(queries, dtype=np.float64))
+        n = queries.shape[0]
+        k = min(k, len(self))
+        n_probe = min(self.n_probe, len(self.lists))
+
+        centroid_sims = self._project(queries) @ self.centroids.T
+        if n_probe < len(self.lists):
+            probes = np.argpartition(-centroid_sims, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probes = np.tile(np.arange(len(self.lists)), (n, 1))
+
+        best_sims = np.full((n, k), -np.inf)
+        best_idx = np.full((n, k), -1, dtype=np.int64)
+
+        # Group queries by probed list so each inverted list is scanned once
+        flat = probes.ravel()
+        order = np.argsort(flat, kind="stable")
+        query_ids = np.repeat(np.arange(n), probes.shape[1])[order]
+        bounds = np.searchsorted(flat[order], np.arange(len(self.lists) + 1))
+
+        for l, members in enumerate(self.lists):
+            q = query_ids[bounds[l]:bounds[l + 1]]
+            if len(members) == 0 or len(q) == 0:
+                continue
+            sims = _dense(queries[q] @ self.vectors[members].T)
+            idx = np.broadcast_to(members, sims.shape)
+            best_sims[q], best_idx[q] = _merge_topk(best_sims[q], best_idx[q], sims, idx, k)
+
+        best_sims[np.isinf(best_sims)] = -1.0
+        return _finish(best_sims, best_idx)
+
+
+BACKENDS = {"exact": ExactIndex, "ivf": IVFIndex}
+
+
+class TextIndex:
+    """
+    Nearest-neighbour index over a reference set of design descriptions.
+
+    Holds the TF-IDF vectorizer fitted on the reference text together with a
+    vector index, so it can be built once per reference set, saved, and queried
+    with new candidate descriptions.
+    """
+
+    def __init__(self, backend="exact", vectorizer=None, **backend_kwargs):
+        self.backend = backend
+        self.vectorizer = vectorizer
+        self.index = BACKENDS[backend](**backend_kwargs)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _vectorize(self, descriptions):
+        # Already-vectorized input (from the same vectorizer) passes straight through
+        if sp.issparse(descriptions):
+            if descriptions.shape[1] != len(self.vectorizer.vocabulary_):
+                raise ValueError(f"Query vectors have {descriptions.shape[1]} features but this index's "
+                                 f"vectorizer has {len(self.vectorizer.vocabulary_)}")
+            return descriptions
+        return self.vectorizer.transform([str(d) for d in descriptions])
+
+    def build(self, descriptions):
+        if self.vectorizer is None:
+            self.vectorizer = TfidfVectorizer().fit([str(d) for d in descriptions])
+        self.index.build(self._vectorize(descriptions))
+        return self
+
+    def query(self, descriptions, k=1):
+        return self.index.query(self._vectorize(descriptions), k=k)
+
+    def min_distances(self, descriptions):
+        distances, _ = self.query(descriptions, k=1)
+        return distances[:, 0]
+
+
+def mmr_select(relevance, vectors, k, diversity=0.3):
+    """
+    Greedy maximal-marginal-relevance selection; returns k row indices in
+    pick order.
+
+    Each step takes the row maximizing
+        (1 - diversity) * relevance_i - diversity * max_{s in selected} cos(i, s)
+    with relevance min-max scaled to [0, 1]. The max-similarity term only
+    grows as the selection grows, so gains never increase and lazy greedy
+    applies: rows wait in a heap keyed by their last gain, and only a popped
+    row is re-scored, against just the picks made since it was last scored.
+    """
+    relevance = np.asarray(relevance, dtype=np.float64)
+    n = len(relevance)
+    k = min(int(k), n)
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    spread = np.nanmax(relevance) - np.nanmin(relevance)
+    relevance = np.nan_to_num((relevance - np.nanmin(relevance)) / spread if spread > 0 else np.ones(n))
+
+    X = l2_normalize(vectors.tocsr() if sp.issparse(vectors) else np.asarray(vectors, dtype=np.float32))
+    sparse = sp.issparse(X)
+    picked = np.zeros((k, X.shape[1]), dtype=np.float32)
+    max_sim = np.zeros(n)
+    scored_against = np.zeros(n, dtype=np.int64)
+    selected = []
+
+    heap = [(-(1 - diversity) * rel, i) for i, rel in enumerate(relevance)]
+    heapq.heapify(heap)
+    while heap and len(selected) < k:
+        _, i = heapq.heappop(heap)
+        t = len(selected)
+        if scored_against[i] < t:
+            # Only the picks made since row i was last scored can raise its max
+            block = picked[scored_against[i]:t]
+            if sparse:
+                start, stop = X.indptr[i], X.indptr[i + 1]
+                sims = block[:, X.indices[start:stop]] @ X.data[start:stop]
+            else:
+                sims = block @ X[i]
+            if len(sims):
+                max_sim[i] = max(max_sim[i], float(sims.max()))
+            scored_against[i] = t
+            gain = (1 - diversity) * relevance[i] - diversity * max_sim[i]
+            if heap and gain < -heap[0][0]:
+                heapq.heappush(heap, (-gain, i))
+                continue
+        selected.append(i)
+        picked[t] = X[i].toarray().ravel() if sparse else X[i]
+    return np.array(selected, dtype=np.int64)
+
+
+def build_text_index(descriptions, backend="exact", **backend_kwargs) -> TextIndex:
+    return TextIndex(backend=backend, **backend_kwargs).build(descriptions)
+
+
+def save_index(index, path):
+    joblib.dump(index, path)
+    return path
+
+
+def load_index(path):
+    return joblib.load(path)
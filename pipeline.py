@@ -0,0 +1,261 @@
+"""
+Headless batch entry point for the PickWise pipeline:
+
+    scrape -> extract -> score -> recommend
+
+Example:
+    python pipeline.py --urls-file competitors.txt --candidates-dir drops/ss25 \
+        --past past_brand.parquet --workdir runs/ss25 --resume
+
+Each stage checkpoints its output as a storage.py Parquet artifact in
+--workdir (scraped products partitioned by brand) and records its wall time
+in manifest.json; with --resume, stages whose checkpoint exists are loaded
+instead of re-run.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+import pandas as pd
+import instrumentation
+import storage
+from instrumentation import timer
+# Extractor categories -> attribute columns used by the scorers
+from attribute_scores import CATEGORY_COLUMNS as ATTRIBUTE_COLUMNS
+
+STAGES = ["scrape", "extract", "score", "recommend"]
+
+# Checkpoint partitioning per stage
+STAGE_PARTITIONS = {"scrape": ["brand"]}
+
+
+def read_table(path):
+    # Parquet files and storage.py artifact directories; CSV for hand-made inputs
+    if path.endswith(".parquet") or os.path.isdir(path):
+        return storage.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def to_scoring_columns(df):
+    """
+    Rename extractor output to the scorers' lowercase attribute columns,
+    treating "Unknown" as missing.
+    """
+    df = df.rename(columns=ATTRIBUTE_COLUMNS)
+    for column in ATTRIBUTE_COLUMNS.values():
+        if column in df:
+            df[column] = df[column].map(lambda v: v.lower() if isinstance(v, str) and v != "Unknown" else None)
+    return df
+
+
+def list_images(directory):
+    from utils import is_image_file
+    return sorted(
+        os.path.join(root, name)
+        for root, _, files in os.walk(directory)
+        for name in files if is_image_file(name)
+    )
+
+
+class Run:
+    """
+    Checkpointed pipeline run rooted at workdir.
+    """
+
+    def __init__(self, workdir, resume=False):
+        self.workdir = workdir
+        self.resume = resume
+        os.makedirs(workdir, exist_ok=True)
+        self.manifest_path = os.path.join(workdir, "manifest.json")
+        self.manifest = {"stages": {}}
+        if resume and os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+
+    def checkpoint_path(self, stage):
+        return storage.artifact_path(stage, self.workdir)
+
+    def load_checkpoint(self, stage):
+        if not storage.artifact_exists(stage, self.workdir):
+            return None
+        return storage.read_artifact(stage, store_dir=self.workdir)
+
+    def stage(self, name, fn):
+        """
+        Run fn() for a stage, or load its checkpoint when resuming.
+        """
+        if self.resume and storage.artifact_exists(name, self.workdir):
+            print(f"[{name}] resumed from {self.checkpoint_path(name)}")
+            return self.load_checkpoint(name)
+
+        start = time.perf_counter()
+        with timer(f"pipeline.{name}"):
+            df = fn()
+        elapsed = time.perf_counter() - start
+        path = storage.write_artifact(df, name, partition_cols=STAGE_PARTITIONS.get(name, []),
+                                      store_dir=self.workdir)
+
+        self.manifest["stages"][name] = {
+            "seconds": round(elapsed, 3),
+            "rows": int(len(df)),
+            "finished_at": datetime.now().isoformat(),
+            "output": path,
+        }
+        with open(self.manifest_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        print(f"[{name}] {len(df)} rows in {elapsed:.1f}s -> {path}")
+        return df
+
+
+def scrape_stage(args):
+    if args.competitors:
+        return read_table(args.competitors)
+    if not args.urls_file:
+        return pd.DataFrame()
+    from scraper import scrape_all_sources
+    with open(args.urls_file) as f:
+        urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    frames = list(scrape_all_sources(urls, backend=args.scrape_backend).values())
+    competitors = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if args.enrich_competitors and not competitors.empty:
+        from attribute_extractor import enrich_scraped_products
+        competitors = enrich_scraped_products(competitors, mode=args.mode, batch_size=args.batch_size,
+                                              profile=args.profile, dedupe=args.dedupe)
+    return competitors
+
+
+def extract_stage(args):
+    if args.candidates:
+        return read_table(args.candidates)
+    from attribute_extractor import enrich_attributes_from_images
+    images = list_images(args.candidates_dir)
+    return enrich_attributes_from_images(images, mode=args.mode, batch_size=args.batch_size, skip_errors=True,
+                                         profile=args.profile, dedupe=args.dedupe)
+
+
+def score_stage(args, candidates, competitors):
+    # Scores are relative to the market; without it every score would be NaN
+    if competitors.empty:
+        raise SystemExit("score needs competitor products: pass --urls-file or --competitors "
+                         "(or the scrape returned nothing)")
+    past = read_table(args.past) if args.past else pd.DataFrame()
+    if past.empty:
+        print("No past assortment (--past); newness to brand is scored neutral (0.5)")
+    if args.scorer == "text":
+        missing = [name for name, df in [("candidates", candidates), ("competitors", competitors)]
+                   if "design_description" not in df]
+        if missing:
+            raise SystemExit(f"--scorer text needs a design_description column in {' and '.join(missing)}; "
+                             "use --scorer attributes for image-extracted candidates")
+        from buyability_score import compute_buyability_scores
+        from text_features import load_or_fit_text_model
+        text_model = load_or_fit_text_model(
+            past.get("design_description", pd.Series(dtype=str)),
+            competitors.get("design_description", pd.Series(dtype=str)),
+            path=os.path.join(args.workdir, "text_model.joblib"),
+            cache_dir=os.path.join(args.workdir, "text_features"),
+        )
+        return compute_buyability_scores(candidates, past, competitors, text_model=text_model)
+
+    from recommendation import compute_buyability_scores
+    return compute_buyability_scores(to_scoring_columns(candidates), to_scoring_columns(past),
+                                     to_scoring_columns(competitors))
+
+
+def recommend_stage(args, scored):
+    from recommendation import recommend_top_n
+    return recommend_top_n(scored, top_n=args.top_n, prompt_filters=args.prompt, diversity=args.diversity)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the PickWise pipeline without the Streamlit UI.")
+    parser.add_argument("--workdir", default=None,
+                        help="Directory for stage checkpoints and the run manifest "
+                             "(default output/runs/<timestamp>)")
+    parser.add_argument("--resume", action="store_true", help="Reuse checkpoints of already finished stages")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Comma-separated subset of {','.join(STAGES)}")
+
+    sources = parser.add_argument_group("inputs")
+    sources.add_argument("--urls-file", help="Competitor listing URLs, one per line")
+    sources.add_argument("--competitors", help="Competitor table (CSV/Parquet/artifact dir) instead of scraping")
+    sources.add_argument("--candidates-dir", help="Directory of candidate product images")
+    sources.add_argument("--candidates", help="Candidate attribute table (CSV/Parquet) instead of extraction")
+    sources.add_argument("--past", help="Past brand assortment table (CSV/Parquet)")
+
+    options = parser.add_argument_group("options")
+    options.add_argument("--scrape-backend", default="auto", choices=["auto", "http", "browser"])
+    options.add_argument("--enrich-competitors", action="store_true",
+                         help="Download competitor images and extract their attributes")
+    options.add_argument("--mode", default="caption", choices=["caption", "clip", "hybrid"],
+                         help="Attribute extraction mode")
+    options.add_argument("--batch-size", type=int, default=8)
+    options.add_argument("--profile", default=None,
+                         help="Inference profile from inference_profiles.py (fp32, int8, bf16, compiled, fast, quality)")
+    options.add_argument("--scorer", default="attributes", choices=["attributes", "text"],
+                         help="recommendation.py attribute scorer or buyability_score.py text scorer")
+    options.add_argument("--top-n", type=int, default=12)
+    options.add_argument("--prompt", default="", help="Prompt filters passed to recommend_top_n")
+    options.add_argument("--metrics", nargs="?", const="", default=None,
+                         help="Record per-stage metrics to this file (.prom for Prometheus text, "
+                              "else JSON; default <workdir>/metrics.json)")
+    options.add_argument("--diversity", type=float, default=0.0,
+                         help="0 ranks by score alone; up to 1 favours a varied range (MMR)")
+    options.add_argument("--dedupe", action="store_true",
+                         help="Extract near-duplicate images (perceptual hash) once and copy their attributes")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    selected = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(selected) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages: {', '.join(sorted(unknown))}")
+    if "extract" in selected and not (args.candidates or args.candidates_dir):
+        raise SystemExit("extract needs --candidates-dir or --candidates")
+    if args.workdir is None:
+        # A fresh timestamped directory never holds an earlier run's checkpoints
+        if args.resume:
+            raise SystemExit("--resume needs --workdir pointing at the run to resume")
+        args.workdir = os.path.join("output", "runs", datetime.now().strftime("%Y%m%d_%H%M%S"))
+
+    run = Run(args.workdir, resume=args.resume)
+    if args.metrics is not None:
+        instrumentation.enable()
+
+    def stage_or_checkpoint(name, fn):
+        # Stages left out of --stages still feed later ones from their checkpoint
+        if name in selected:
+            return run.stage(name, fn)
+        return run.load_checkpoint(name)
+
+    def require(df, name, needed_by):
+        if df is None and needed_by in selected:
+            raise SystemExit(f"{needed_by} needs the {name} checkpoint, which is not in {args.workdir}; "
+                             f"add {name} to --stages or point --workdir at an earlier run")
+        return df
+
+    competitors = stage_or_checkpoint("scrape", lambda: scrape_stage(args))
+    if competitors is None:
+        competitors = pd.DataFrame()
+
+    candidates = require(stage_or_checkpoint("extract", lambda: extract_stage(args)), "extract", "score")
+
+    scored = None
+    if candidates is not None:
+        scored = stage_or_checkpoint("score", lambda: score_stage(args, candidates, competitors))
+    scored = require(scored, "score", "recommend")
+    if scored is not None:
+        stage_or_checkpoint("recommend", lambda: recommend_stage(args, scored))
+
+    timings = {name: info["seconds"] for name, info in run.manifest["stages"].items()}
+    print("Stage timings (s): " + ", ".join(f"{k}={v}" for k, v in timings.items()))
+    if args.metrics is not None:
+        path = instrumentation.write_metrics(args.metrics or os.path.join(args.workdir, "metrics.json"))
+        print(f"Metrics written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_distances
-from sklearn.preprocessing import MultiLabelBinarizer
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize as l2_normalize
+from attribute_scores import score_matrix, LABELS, CATEGORY_COLUMNS
+from nn_index import mmr_select
+from instrumentation import timer
 
 # Default weights (can be overridden via UI sliders)
 DEFAULT_WEIGHTS = {
@@ -11,51 +14,243 @@ DEFAULT_WEIGHTS = {
     "completeness": 0.2
 }
 
+# Attribute columns that feed the tag features
+ATTRIBUTES = ["style", "material", "color", "print", "length", "occasion", "neckline", "sleeve_type", "texture"]
+
+def _attribute_values(df: pd.DataFrame, attr: str) -> pd.Series:
+    # Non-empty values as strings, everything else NaN
+    if attr not in df:
+        return pd.Series(np.nan, index=df.index, dtype=object)
+    values = df[attr]
+    return values.astype(str).where(values.notna() & (values != ""))
+
+def fit_tag_vocabulary(df: pd.DataFrame, attributes: list = ATTRIBUTES) -> pd.Index:
+    """
+    Sorted set of tag values seen across the attribute columns of df.
+    """
+    values = pd.concat([_attribute_values(df, attr) for attr in attributes], ignore_index=True)
+    return pd.Index(np.sort(values.dropna().unique()))
+
+def build_tag_matrix(df: pd.DataFrame, vocabulary: pd.Index, attributes: list = ATTRIBUTES) -> sp.csr_matrix:
+    """
+    Binary CSR tag matrix (rows x vocabulary) built from per-attribute category codes.
+    A value appearing in several attributes of a row counts once; values outside
+    the vocabulary are ignored.
+    """
+    rows, cols = [], []
+    for attr in attributes:
+        codes = pd.Categorical(_attribute_values(df, attr), categories=vocabulary).codes
+        present = np.flatnonzero(codes >= 0)
+        rows.append(present)
+        cols.append(codes[present])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    matrix = sp.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, cols)),
+                           shape=(len(df), len(vocabulary)))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1.0
+    return matrix
+
+# Attributes with no label codes; weighted features carry them as binary tags
+TAG_ONLY_ATTRIBUTES = [attr for attr in ATTRIBUTES if attr not in CATEGORY_COLUMNS.values()]
+
+def weighted_features(df: pd.DataFrame, vocabulary: pd.Index) -> sp.csr_matrix:
+    """
+    Confidence-weighted label scores followed by binary tags over vocabulary
+    for the TAG_ONLY_ATTRIBUTES, so every attribute counted by completeness
+    also shapes the distances.
+    """
+    return sp.hstack([score_matrix(df), build_tag_matrix(df, vocabulary, TAG_ONLY_ATTRIBUTES)], format="csr")
+
+def compute_completeness(df: pd.DataFrame, attributes: list = ATTRIBUTES) -> np.ndarray:
+    """
+    Share of attribute columns filled in per row.
+    """
+    filled = np.column_stack([_attribute_values(df, attr).notna().to_numpy() for attr in attributes])
+    return filled.mean(axis=1)
+
+# Score column -> weight key, in the order components are stored
+COMPONENTS = {
+    "score_newness_market": "newness_to_market",
+    "score_newness_brand": "newness_to_brand",
+    "score_variety": "variety",
+    "score_completeness": "completeness",
+}
+
+def _normalized_total(matrix):
+    # Column sums of the L2-normalized rows, and the row count
+    if matrix.shape[0] == 0:
+        return np.zeros(matrix.shape[1]), 0
+    return np.asarray(l2_normalize(matrix).sum(axis=0)).ravel(), matrix.shape[0]
+
+class ScoringSession:
+    """
+    Buyability scoring that keeps its work between calls.
+
+    Holds the four component score vectors plus the few sums they are derived
+    from (the normalized column totals of the competitor and past-brand
+    matrices and of the candidates themselves, as in mean_cosine_distances).
+    Changing weights is then one weighted sum, and adding or removing
+    candidates only scores the affected rows and shifts every variety mean by
+    their dot products. Results match compute_buyability_scores on the same data.
+
+    The tag vocabulary comes from the candidates (for weighted labels, only
+    the attributes without label codes use tags); a change that adds or
+    retires a tag value triggers a full refit to keep that behaviour.
+    """
+
+    def __init__(self, df: pd.DataFrame, past_brand_df: pd.DataFrame, competitor_df: pd.DataFrame,
+                 weights: dict = DEFAULT_WEIGHTS):
+        self.weights = dict(weights)
+        self.past_brand_df = past_brand_df
+        self.competitor_df = competitor_df
+        self._fit(df.reset_index(drop=True))
+
+    def _fit(self, df):
+        with timer("distance.attributes_fit", items=len(df)):
+            self._fit_all(df)
+
+    def _fit_all(self, df):
+        self.candidates = df
+        self._weighted = "attribute_codes" in df
+        self._tag_attributes = TAG_ONLY_ATTRIBUTES if self._weighted else ATTRIBUTES
+        # Tag columns follow the label columns in the weighted feature matrix
+        self._tag_offset = len(LABELS) if self._weighted else 0
+        self._vocabulary = fit_tag_vocabulary(df, self._tag_attributes)
+
+        tag_matrix = self._features(df)
+        self._market_total, self._market_n = _normalized_total(self._features(self.competitor_df))
+        self._brand_total, self._brand_n = _normalized_total(self._features(self.past_brand_df))
+
+        self._rows = l2_normalize(tag_matrix) if len(df) else tag_matrix
+        self._self_total = np.asarray(self._rows.sum(axis=0)).ravel()
+        self._self_dots = np.asarray(self._rows @ self._self_total).ravel()
+        self._tag_counts = np.asarray((tag_matrix != 0).sum(axis=0)).ravel()
+
+        market, brand, completeness = self._row_components(df, self._rows)
+        self._components = np.column_stack([market, brand, np.zeros(len(df)), completeness])
+        self._refresh_variety()
+
+    def _features(self, frame):
+        # Confidence-weighted labels when candidates carry the extractor's
+        # attribute_codes / attribute_scores, else binary tags
+        if self._weighted:
+            return weighted_features(frame, self._vocabulary)
+        return build_tag_matrix(frame, self._vocabulary)
+
+    def _row_components(self, frame, rows):
+        # Per-row components that do not depend on the other candidates
+        # No reference rows: neutral 0.5, as buyability_score.compute_newness does
+        market = (1.0 - np.asarray(rows @ self._market_total).ravel() / self._market_n
+                  if self._market_n else np.full(rows.shape[0], 0.5))
+        brand = (1.0 - np.asarray(rows @ self._brand_total).ravel() / self._brand_n
+                 if self._brand_n else np.full(rows.shape[0], 0.5))
+        return market, brand, compute_completeness(frame)
+
+    def _refresh_variety(self):
+        n = len(self.candidates)
+        if not n:
+            return
+        variety = 1.0 - self._self_dots / n
+        # All-zero rows sit at distance 1 from themselves unless the diagonal is zeroed
+        zero_rows = self._rows.getnnz(axis=1) == 0
+        variety[zero_rows] -= 1.0 / n
+        self._components[:, 2] = variety
+
+    def set_weights(self, weights: dict) -> pd.DataFrame:
+        self.weights = dict(weights)
+        return self.scores()
+
+    def scores(self, weights: dict = None) -> pd.DataFrame:
+        """
+        Candidates with their component scores and the weighted buyability
+        score, best first, as compute_buyability_scores returns them.
+        """
+        weights = self.weights if weights is None else weights
+        vector = np.array([weights[key] for key in COMPONENTS.values()])
+        scored = self.candidates.copy()
+        for position, column in enumerate(COMPONENTS):
+            scored[column] = self._components[:, position]
+        scored["buyability_score"] = self._components @ vector
+        return scored.sort_values(by="buyability_score", ascending=False).reset_index(drop=True)
+
+    def add_candidates(self, new_df: pd.DataFrame) -> pd.Index:
+        """
+        Append candidates and return their labels in self.candidates.
+        """
+        start = int(self.candidates.index.max()) + 1 if len(self.candidates) else 0
+        new_df = new_df.set_axis(pd.RangeIndex(start, start + len(new_df)))
+        combined = pd.concat([self.candidates, new_df])
+
+        if len(fit_tag_vocabulary(new_df, self._tag_attributes).difference(self._vocabulary)):
+            self._fit(combined)
+            return new_df.index
+
+        tag_matrix = self._features(new_df)
+        new_rows = l2_normalize(tag_matrix) if len(new_df) else tag_matrix
+        added_total = np.asarray(new_rows.sum(axis=0)).ravel()
+        self._self_total = self._self_total + added_total
+        self._self_dots = np.concatenate([
+            self._self_dots + np.asarray(self._rows @ added_total).ravel(),
+            np.asarray(new_rows @ self._self_total).ravel(),
+        ])
+        self._rows = sp.vstack([self._rows, new_rows], format="csr")
+        self._tag_counts = self._tag_counts + np.asarray((tag_matrix != 0).sum(axis=0)).ravel()
+
+        market, brand, completeness = self._row_components(new_df, new_rows)
+        self._components = np.vstack([self._components,
+                                      np.column_stack([market, brand, np.zeros(len(new_df)), completeness])])
+        self.candidates = combined
+        self._refresh_variety()
+        return new_df.index
+
+    def remove_candidates(self, labels) -> None:
+        """
+        Drop candidates by their labels in self.candidates.
+        """
+        drop = self.candidates.index.isin(list(labels))
+        if not drop.any():
+            return
+        removed = self._rows[np.flatnonzero(drop)]
+        keep = np.flatnonzero(~drop)
+
+        counts = self._tag_counts - np.asarray((removed != 0).sum(axis=0)).ravel()
+        if (counts[self._tag_offset:] == 0).any():
+            self._fit(self.candidates.iloc[keep])
+            return
+        self._tag_counts = counts
+
+        removed_total = np.asarray(removed.sum(axis=0)).ravel()
+        self._rows = self._rows[keep]
+        self._self_total = self._self_total - removed_total
+        self._self_dots = self._self_dots[keep] - np.asarray(self._rows @ removed_total).ravel()
+        self._components = self._components[keep]
+        self.candidates = self.candidates.iloc[keep]
+        self._refresh_variety()
+
 def compute_buyability_scores(df: pd.DataFrame, past_brand_df: pd.DataFrame, competitor_df: pd.DataFrame, weights: dict = DEFAULT_WEIGHTS) -> pd.DataFrame:
-    enriched_df = df.copy()
-
-    # Extract and binarize relevant attributes
-    attributes = ["style", "material", "color", "print", "length", "occasion", "neckline", "sleeve_type", "texture"]
-    mlb = MultiLabelBinarizer()
-    all_tags = enriched_df[attributes].fillna('').agg(lambda x: list(set(filter(None, x))), axis=1)
-    tag_matrix = mlb.fit_transform(all_tags)
-
-    # --- 1. Newness to Market ---
-    comp_tags = competitor_df[attributes].fillna('').agg(lambda x: list(set(filter(None, x))), axis=1)
-    comp_matrix = mlb.transform(comp_tags)
-    dist_to_market = cosine_distances(tag_matrix, comp_matrix).mean(axis=1)
-
-    # --- 2. Newness to Brand ---
-    brand_tags = past_brand_df[attributes].fillna('').agg(lambda x: list(set(filter(None, x))), axis=1)
-    brand_matrix = mlb.transform(brand_tags)
-    dist_to_brand = cosine_distances(tag_matrix, brand_matrix).mean(axis=1)
-
-    # --- 3. Variety Within Selection ---
-    dist_within = cosine_distances(tag_matrix)
-    diversity_scores = dist_within.mean(axis=1)
-
-    # --- 4. Completeness Score (balance of attributes)
-    def completeness(row):
-        return np.mean([1 if row[attr] else 0 for attr in attributes])
-    completeness_scores = enriched_df.apply(completeness, axis=1)
-
-    # Weighted Final Score
-    enriched_df["score_newness_market"] = dist_to_market
-    enriched_df["score_newness_brand"] = dist_to_brand
-    enriched_df["score_variety"] = diversity_scores
-    enriched_df["score_completeness"] = completeness_scores
-
-    enriched_df["buyability_score"] = (
-        weights["newness_to_market"] * dist_to_market +
-        weights["newness_to_brand"] * dist_to_brand +
-        weights["variety"] * diversity_scores +
-        weights["completeness"] * completeness_scores
-    )
-
-    return enriched_df.sort_values(by="buyability_score", ascending=False).reset_index(drop=True)
-
-
-def recommend_top_n(df: pd.DataFrame, top_n: int = 12, prompt_filters: str = "") -> pd.DataFrame:
+    """
+    One-off scoring; keep a ScoringSession instead when weights or the
+    candidate set will change.
+    """
+    return ScoringSession(df, past_brand_df, competitor_df, weights).scores()
+
+
+def attribute_vectors(df: pd.DataFrame) -> sp.csr_matrix:
+    """
+    Attribute feature rows of df on their own: confidence-weighted labels when
+    present, else binary tags over df's vocabulary.
+    """
+    if "attribute_codes" in df:
+        return weighted_features(df, fit_tag_vocabulary(df, TAG_ONLY_ATTRIBUTES))
+    return build_tag_matrix(df, fit_tag_vocabulary(df))
+
+def recommend_top_n(df: pd.DataFrame, top_n: int = 12, prompt_filters: str = "",
+                    diversity: float = 0.0, vectors=None) -> pd.DataFrame:
+    """
+    With diversity > 0 the picks trade buyability against similarity to items
+    already picked (greedy MMR, see nn_index.mmr_select) over vectors, which
+    default to the attribute features; rows come back in pick order.
+    """
     # Simple text filter (future: NLP)
     prompt = prompt_filters.lower()
     if prompt:
@@ -66,6 +261,12 @@ def recommend_top_n(df: pd.DataFrame, top_n: int = 12, prompt_filters: str = "")
         if "formal" in prompt:
             df.loc[df['occasion'].str.contains("formal", na=False), 'buyability_score'] += 0.05
 
-    top_df = df.sort_values(by="buyability_score", ascending=False).head(top_n).copy()
+    if diversity > 0:
+        vectors = attribute_vectors(df) if vectors is None else vectors
+        with timer("recommend.mmr", items=len(df)):
+            picks = mmr_select(df["buyability_score"].to_numpy(), vectors, top_n, diversity)
+        top_df = df.iloc[picks].copy()
+    else:
+        top_df = df.sort_values(by="buyability_score", ascending=False).head(top_n).copy()
     top_df['tags'] = top_df.apply(lambda row: list(filter(None, [row.get(attr) for attr in ["style", "material", "color", "print", "length", "occasion"]])), axis=1)
     return top_df
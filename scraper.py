@@ -4,9 +4,31 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
-import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+import json
+import queue
+import re
+import threading
 import pandas as pd
-from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+from urllib.parse import urlparse, urljoin
+from instrumentation import timer, count
+
+# Concurrency defaults for scrape_all_sources
+DEFAULT_MAX_DRIVERS = 4
+DEFAULT_PER_DOMAIN_LIMIT = 2
+PAGE_LOAD_TIMEOUT = 10
+HTTP_TIMEOUT = 15
+HTTP_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"),
+    "Accept-Language": "en-US,en;q=0.9",
+}
 
 
 def init_driver():
@@ -17,160 +39,476 @@ def init_driver():
     driver = webdriver.Chrome(options=chrome_options)
     return driver
 
-def detect_brand_from_url(url):
-    domain = urlparse(url).netloc.lower()
-    if "zara" in domain:
-        return "Zara"
-    elif "hm.com" in domain:
-        return "H&M"
-    elif "shein" in domain:
-        return "Shein"
-    elif "maxfashion" in domain:
-        return "MaxFashion"
-    elif "splash" in domain:
-        return "Splash"
-    else:
-        return "Unknown"
 
-def scrape_zara(url):
-    driver = init_driver()
-    driver.get(url)
-    time.sleep(3)  # Wait for JS to load
-    items = []
-    try:
-        product_elements = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'a.product-link'))
-        )
-        for el in product_elements[:150]:
+class DriverPool:
+    """
+    Bounded pool of reusable headless Chrome drivers.
+
+    Drivers are started lazily up to max_size and handed back after each page;
+    a driver whose page raised anything is discarded and replaced, so a
+    failure never leaks a pool slot.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_DRIVERS):
+        self.max_size = max_size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return init_driver()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            # Pool exhausted: wait for a driver to be returned (or discarded)
             try:
-                name = el.get_attribute("aria-label")
-                link = el.get_attribute("href")
-                image = el.find_element(By.CSS_SELECTOR, 'img').get_attribute("src")
-                items.append({"name": name, "url": link, "image_url": image, "brand": "Zara"})
-            except Exception as e:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
                 continue
-    except TimeoutException:
-        print("Timeout while scraping Zara")
-    driver.quit()
-    return pd.DataFrame(items)
 
+    def _discard(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
 
-def scrape_hm(url):
-    driver = init_driver()
-    driver.get(url)
-    time.sleep(3)
-    items = []
-    try:
-        product_elements = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'li.product-item'))
-        )
-        for el in product_elements[:150]:
+    @contextmanager
+    def driver(self):
+        driver = self._acquire()
+        try:
+            yield driver
+        except BaseException:
+            # Its state is unknown (e.g. chromedriver died mid-request), so never reuse it
+            self._discard(driver)
+            raise
+        else:
+            self._idle.put(driver)
+
+    def close(self):
+        while True:
             try:
-                name = el.find_element(By.CSS_SELECTOR, 'a.product-item-link').text
-                link = el.find_element(By.CSS_SELECTOR, 'a.product-item-link').get_attribute("href")
-                image = el.find_element(By.CSS_SELECTOR, 'img.product-image-photo').get_attribute("src")
-                items.append({"name": name, "url": link, "image_url": image, "brand": "H&M"})
-            except Exception as e:
-                continue
-    except TimeoutException:
-        print("Timeout while scraping H&M")
-    driver.quit()
-    return pd.DataFrame(items)
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
 
 
-def scrape_shein(url):
+@contextmanager
+def _driver_for(driver=None):
+    # Reuse a pooled driver when given, otherwise run on a throwaway one
+    if driver is not None:
+        yield driver
+        return
     driver = init_driver()
-    driver.get(url)
-    time.sleep(3)
-    items = []
     try:
-        product_elements = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'div.shein-goods-item'))
-        )
-        for el in product_elements[:150]:
-            try:
-                name = el.get_attribute("title")
-                link = el.find_element(By.CSS_SELECTOR, 'a').get_attribute("href")
-                image = el.find_element(By.CSS_SELECTOR, 'img').get_attribute("src")
-                items.append({"name": name, "url": link, "image_url": image, "brand": "Shein"})
-            except Exception as e:
-                continue
-    except TimeoutException:
-        print("Timeout while scraping Shein")
-    driver.quit()
-    return pd.DataFrame(items)
+        yield driver
+    finally:
+        driver.quit()
 
 
-def scrape_maxfashion(url):
-    driver = init_driver()
-    driver.get(url)
-    time.sleep(3)
+def load_page(driver, url, timeout=PAGE_LOAD_TIMEOUT):
+    """
+    Navigate and wait for the document to finish loading instead of a fixed sleep.
+    """
+    count("scraper.pages")
+    with timer("scraper.page_load"):
+        driver.get(url)
+        try:
+            WebDriverWait(driver, timeout).until(
+                lambda d: d.execute_script("return document.readyState") == "complete"
+            )
+        except TimeoutException:
+            # Still-loading pages are fine; the product selector wait is the real gate
+            count("scraper.page_load_timeouts")
+
+@dataclass(frozen=True)
+class BrandAdapter:
+    """
+    Declarative description of how to scrape one brand's listing pages.
+
+    fields maps an output column to (css selector inside the item or None for
+    the item itself, "text" or a DOM property/attribute name). Items missing
+    any selected node are skipped, except that optional fields (price) are
+    left empty. pagination is "none", "scroll" (infinite scroll until
+    max_items or no new items) or "next" (follow next_selector).
+    http_first tries the plain HTTP + lxml path before starting a browser,
+    for brands whose listings are server-rendered.
+    """
+    brand: str
+    domains: tuple
+    item_selector: str
+    fields: dict
+    pagination: str = "none"
+    next_selector: str = None
+    max_items: int = 150
+    max_pages: int = 5
+    http_first: bool = False
+    optional: tuple = ("price",)
+
+
+BRAND_ADAPTERS = {}
+
+
+def register_adapter(adapter):
+    BRAND_ADAPTERS[adapter.brand] = adapter
+    return adapter
+
+
+register_adapter(BrandAdapter(
+    brand="Zara", domains=("zara",), item_selector="a.product-link",
+    fields={"name": (None, "aria-label"), "url": (None, "href"), "image_url": ("img", "src"),
+            "price": ("span.price-current__amount", "text")},
+    pagination="scroll",
+))
+register_adapter(BrandAdapter(
+    brand="H&M", domains=("hm.com",), item_selector="li.product-item",
+    fields={"name": ("a.product-item-link", "text"), "url": ("a.product-item-link", "href"),
+            "image_url": ("img.product-image-photo", "src"), "price": ("span.price", "text")},
+    pagination="scroll", http_first=True,
+))
+register_adapter(BrandAdapter(
+    brand="Shein", domains=("shein",), item_selector="div.shein-goods-item",
+    fields={"name": (None, "title"), "url": ("a", "href"), "image_url": ("img", "src"),
+            "price": ("span.normal-price-ctn", "text")},
+    pagination="scroll",
+))
+register_adapter(BrandAdapter(
+    brand="MaxFashion", domains=("maxfashion",), item_selector="div.product-item",
+    fields={"name": ("a.name", "text"), "url": ("a.name", "href"), "image_url": ("img", "src"),
+            "price": ("span.price", "text")},
+    pagination="next", next_selector="a.next", http_first=True,
+))
+register_adapter(BrandAdapter(
+    brand="Splash", domains=("splash",), item_selector="div.product-tile",
+    fields={"name": ("a.name-link", "text"), "url": ("a.name-link", "href"), "image_url": ("img", "src"),
+            "price": ("span.product-sales-price", "text")},
+    pagination="next", next_selector="a.page-next", http_first=True,
+))
+
+
+def get_adapter(url):
+    domain = urlparse(url).netloc.lower()
+    for adapter in BRAND_ADAPTERS.values():
+        if any(d in domain for d in adapter.domains):
+            return adapter
+    return None
+
+
+def detect_brand_from_url(url):
+    adapter = get_adapter(url)
+    return adapter.brand if adapter else "Unknown"
+
+
+# Pulls every field of every item in one round-trip instead of per-element RPCs
+EXTRACT_ITEMS_JS = """
+const [itemSelector, fields, limit, optional] = arguments;
+const items = [];
+for (const el of Array.from(document.querySelectorAll(itemSelector)).slice(0, limit)) {
+    const item = {};
+    let complete = true;
+    for (const [name, [selector, attr]] of Object.entries(fields)) {
+        const node = selector ? el.querySelector(selector) : el;
+        if (!node) {
+            if (optional.includes(name)) { item[name] = null; continue; }
+            complete = false;
+            break;
+        }
+        let value;
+        if (attr === "text") {
+            value = (node.innerText || "").trim();
+        } else {
+            value = node[attr];
+            if (value === undefined || value === null || typeof value === "object") {
+                value = node.getAttribute(attr);
+            }
+        }
+        item[name] = value;
+    }
+    if (complete) items.push(item);
+}
+return items;
+"""
+
+SCROLL_JS = """
+window.scrollTo(0, document.body.scrollHeight);
+return document.querySelectorAll(arguments[0]).length;
+"""
+
+NEXT_LINK_JS = """
+const link = document.querySelector(arguments[0]);
+return link ? link.href : null;
+"""
+
+
+def _count_items(driver, adapter):
+    return driver.execute_script("return document.querySelectorAll(arguments[0]).length",
+                                 adapter.item_selector)
+
+
+def _scroll_until_loaded(driver, adapter):
+    count = _count_items(driver, adapter)
+    for _ in range(adapter.max_pages - 1):
+        if count >= adapter.max_items:
+            break
+        driver.execute_script(SCROLL_JS, adapter.item_selector)
+        try:
+            WebDriverWait(driver, 3).until(lambda d: _count_items(d, adapter) > count)
+        except TimeoutException:
+            break
+        count = _count_items(driver, adapter)
+
+
+def extract_items(driver, adapter, limit=None):
+    fields = {name: list(spec) for name, spec in adapter.fields.items()}
+    return driver.execute_script(EXTRACT_ITEMS_JS, adapter.item_selector, fields,
+                                 limit if limit is not None else adapter.max_items, list(adapter.optional)) or []
+
+
+def scrape_with_adapter(adapter, url, driver=None):
+    """
+    Shared extraction engine: load the listing, paginate per the adapter and
+    return a DataFrame with the adapter's fields plus brand.
+    """
+    items = []
+    with _driver_for(driver) as driver:
+        load_page(driver, url)
+        try:
+            WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+                EC.presence_of_all_elements_located((By.CSS_SELECTOR, adapter.item_selector))
+            )
+        except TimeoutException:
+            print(f"Timeout while scraping {adapter.brand}")
+            return pd.DataFrame()
+
+        if adapter.pagination == "scroll":
+            _scroll_until_loaded(driver, adapter)
+            items = extract_items(driver, adapter)
+        elif adapter.pagination == "next":
+            for _ in range(adapter.max_pages):
+                items.extend(extract_items(driver, adapter, adapter.max_items - len(items)))
+                next_url = driver.execute_script(NEXT_LINK_JS, adapter.next_selector)
+                if len(items) >= adapter.max_items or not next_url or next_url == driver.current_url:
+                    break
+                load_page(driver, next_url)
+                try:
+                    WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+                        EC.presence_of_all_elements_located((By.CSS_SELECTOR, adapter.item_selector))
+                    )
+                except TimeoutException:
+                    break
+        else:
+            items = extract_items(driver, adapter)
+
+    return listing_frame(items, adapter)
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session(pool_size=DEFAULT_MAX_DRIVERS * DEFAULT_PER_DOMAIN_LIMIT):
+    """
+    Shared keep-alive HTTP session with connection pooling and retries.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            session.headers.update(HTTP_HEADERS)
+            retries = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+    return _http_session
+
+
+def _json_ld_items(soup, base_url):
+    # Fallback for listings that ship their products as schema.org JSON-LD
     items = []
+    for script in soup.select('script[type="application/ld+json"]'):
+        try:
+            data = json.loads(script.string or "")
+        except ValueError:
+            continue
+        for node in data if isinstance(data, list) else [data]:
+            entries = node.get("itemListElement", []) if isinstance(node, dict) else []
+            for entry in entries:
+                product = entry.get("item", entry) if isinstance(entry, dict) else None
+                if not isinstance(product, dict) or not product.get("name"):
+                    continue
+                image = product.get("image")
+                if isinstance(image, list):
+                    image = image[0] if image else None
+                offers = product.get("offers")
+                offers = offers[0] if isinstance(offers, list) and offers else offers
+                items.append({
+                    "name": product.get("name"),
+                    "url": urljoin(base_url, product.get("url") or entry.get("url") or ""),
+                    "image_url": urljoin(base_url, image) if isinstance(image, str) else None,
+                    "price": offers.get("price") if isinstance(offers, dict) else None,
+                })
+    return items
+
+
+def parse_price(value):
+    """
+    Numeric price from listing text such as "AED 1,299.00" or "129,90 €"; None if absent.
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    match = re.search(r"\d[\d.,\s]*", str(value))
+    if not match:
+        return None
+    number = re.sub(r"\s", "", match.group()).rstrip(".,")
+    # A trailing ",dd" is a decimal comma; other separators group thousands
+    if re.search(r",\d{1,2}$", number):
+        number = number.replace(".", "").replace(",", ".")
+    else:
+        number = number.replace(",", "")
     try:
-        product_elements = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'div.product-item'))
-        )
-        for el in product_elements[:150]:
-            try:
-                name = el.find_element(By.CSS_SELECTOR, 'a.name').text
-                link = el.find_element(By.CSS_SELECTOR, 'a.name').get_attribute("href")
-                image = el.find_element(By.CSS_SELECTOR, 'img').get_attribute("src")
-                items.append({"name": name, "url": link, "image_url": image, "brand": "MaxFashion"})
-            except Exception as e:
-                continue
-    except TimeoutException:
-        print("Timeout while scraping MaxFashion")
-    driver.quit()
-    return pd.DataFrame(items)
+        return float(number)
+    except ValueError:
+        return None
 
 
-def scrape_splash(url):
-    driver = init_driver()
-    driver.get(url)
-    time.sleep(3)
+def listing_frame(items, adapter):
+    """
+    DataFrame of parsed listing items: the adapter's fields plus brand, one
+    row per product URL, prices as numbers.
+    """
+    df = pd.DataFrame(items, columns=list(adapter.fields))
+    if df.empty:
+        return pd.DataFrame()
+    if "price" in df:
+        df["price"] = df["price"].map(parse_price).astype(float)
+    df["brand"] = adapter.brand
+    if "url" in df:
+        df = df.drop_duplicates(subset="url").reset_index(drop=True)
+    return df
+
+
+def parse_listing_html(html, adapter, base_url="", limit=None):
+    """
+    Extract items from listing HTML with the adapter's selectors (lxml parser).
+    Pure function, so it can be exercised offline against saved pages.
+    """
+    with timer("scraper.parse_html"):
+        soup = BeautifulSoup(html, "lxml")
+    limit = adapter.max_items if limit is None else limit
     items = []
+    for el in soup.select(adapter.item_selector)[:limit]:
+        item = {}
+        for name, (selector, attr) in adapter.fields.items():
+            node = el.select_one(selector) if selector else el
+            if node is None:
+                if name in adapter.optional:
+                    item[name] = None
+                    continue
+                item = None
+                break
+            if attr == "text":
+                item[name] = node.get_text(" ", strip=True)
+            else:
+                value = node.get(attr)
+                if isinstance(value, list):
+                    value = " ".join(value)
+                item[name] = urljoin(base_url, value) if value and attr in ("href", "src") else value
+        if item is not None:
+            items.append(item)
+    if not items:
+        items = _json_ld_items(soup, base_url)[:limit]
+    return items
+
+
+def scrape_http(adapter, url, session=None):
+    """
+    Browserless scrape: fetch listing pages over HTTP and parse them with lxml.
+    Returns an empty DataFrame when the page needs JavaScript (or fails), so
+    callers can fall back to Selenium.
+    """
+    session = session or get_http_session()
+    items = []
+    page_url = url
     try:
-        product_elements = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'div.product-tile'))
-        )
-        for el in product_elements[:150]:
-            try:
-                name = el.find_element(By.CSS_SELECTOR, 'a.name-link').text
-                link = el.find_element(By.CSS_SELECTOR, 'a.name-link').get_attribute("href")
-                image = el.find_element(By.CSS_SELECTOR, 'img').get_attribute("src")
-                items.append({"name": name, "url": link, "image_url": image, "brand": "Splash"})
-            except Exception as e:
-                continue
-    except TimeoutException:
-        print("Timeout while scraping Splash")
-    driver.quit()
-    return pd.DataFrame(items)
+        for _ in range(adapter.max_pages if adapter.pagination == "next" else 1):
+            count("scraper.pages")
+            with timer("scraper.http_get"):
+                response = session.get(page_url, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            items.extend(parse_listing_html(response.text, adapter, base_url=response.url,
+                                            limit=adapter.max_items - len(items)))
+            if adapter.pagination != "next" or len(items) >= adapter.max_items:
+                break
+            link = BeautifulSoup(response.text, "lxml").select_one(adapter.next_selector)
+            next_url = urljoin(response.url, link.get("href")) if link is not None and link.get("href") else None
+            if not next_url or next_url == page_url:
+                break
+            page_url = next_url
+    except requests.RequestException as e:
+        print(f"HTTP fetch failed for {adapter.brand}: {e}")
 
+    return listing_frame(items, adapter)
 
-def scrape_all_sources(url_list):
-    all_data = {}
-    for url in url_list:
-        if not url:
-            continue
-        brand = detect_brand_from_url(url)
+
+def scrape_brand(brand, url, driver=None):
+    return scrape_with_adapter(BRAND_ADAPTERS[brand], url, driver=driver)
+
+
+def scrape_all_sources(url_list, max_drivers=DEFAULT_MAX_DRIVERS, per_domain_limit=DEFAULT_PER_DOMAIN_LIMIT,
+                       backend="auto"):
+    """
+    Scrape every URL concurrently on a shared pool of drivers, with at most
+    per_domain_limit pages in flight per domain. Returns {brand: DataFrame}.
+
+    backend="auto" takes the HTTP path for http_first adapters and falls back
+    to the browser when it yields nothing; "http" and "browser" force one path.
+    """
+    urls = [url for url in url_list if url]
+    domain_limits = {urlparse(url).netloc.lower(): threading.Semaphore(per_domain_limit) for url in urls}
+    pool = DriverPool(max_size=max_drivers)
+
+    def scrape_one(url):
+        adapter = get_adapter(url)
+        if adapter is None:
+            return "Unknown", pd.DataFrame()
         try:
-            if brand == "Zara":
-                df = scrape_zara(url)
-            elif brand == "H&M":
-                df = scrape_hm(url)
-            elif brand == "Shein":
-                df = scrape_shein(url)
-            elif brand == "MaxFashion":
-                df = scrape_maxfashion(url)
-            elif brand == "Splash":
-                df = scrape_splash(url)
-            else:
-                df = pd.DataFrame()
-            if not df.empty:
+            with domain_limits[urlparse(url).netloc.lower()]:
+                if backend == "http" or (backend == "auto" and adapter.http_first):
+                    df = scrape_http(adapter, url)
+                    if not df.empty or backend == "http":
+                        return adapter.brand, df
+                with pool.driver() as driver:
+                    return adapter.brand, scrape_with_adapter(adapter, url, driver=driver)
+        except Exception as e:
+            print(f"Error scraping {adapter.brand}: {e}")
+            return adapter.brand, pd.DataFrame()
+
+    all_data = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_drivers * per_domain_limit)) as executor:
+            # map() keeps URL order, so per-brand concatenation is deterministic
+            for brand, df in executor.map(scrape_one, urls):
+                if df.empty:
+                    continue
                 if brand not in all_data:
                     all_data[brand] = df
                 else:
                     all_data[brand] = pd.concat([all_data[brand], df], ignore_index=True)
-        except Exception as e:
-            print(f"Error scraping {brand}: {e}")
+    finally:
+        pool.close()
     return all_data
@@ -0,0 +1,126 @@
+"""
+Columnar storage for pipeline artifacts (scraped products, attributes, scores).
+
+Each artifact is a Parquet dataset directory under the store, optionally
+partitioned (e.g. products by brand). Attribute and brand columns are
+written as dictionary-encoded categoricals, which both shrinks the files and
+comes back from read_artifact as pandas category dtype instead of object
+strings. Reads support column projection and predicate pushdown:
+
+    read_artifact("products", columns=["name", "image_url"],
+                  filters=[("brand", "==", "Zara")])
+
+filters use the pyarrow/pandas form: a list of (column, op, value) tuples
+ANDed together, or a list of such lists ORed. Partition directories that
+cannot match are never opened, and row groups are skipped from their
+min/max statistics. CSV is kept only for exports from the UI.
+"""
+import os
+import re
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_STORE_DIR = os.environ.get("PICKWISE_STORE_DIR", os.path.join("output", "store"))
+
+# Rows per Parquet row group: the granularity of predicate pushdown
+ROW_GROUP_SIZE = 64 * 1024
+
+# Low-cardinality string columns stored as categoricals
+CATEGORICAL_COLUMNS = [
+    "brand", "style", "material", "color", "print", "length", "occasion", "neckline", "sleeve_type",
+    "texture", "pattern", "Color", "Material", "Style", "SleeveType", "Neckline", "Pattern",
+]
+
+# Default partitioning per artifact
+PARTITIONS = {
+    "products": ["brand"],
+}
+
+
+def artifact_path(name, store_dir=DEFAULT_STORE_DIR):
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_")
+    return os.path.join(store_dir, slug)
+
+
+def to_categorical(df: pd.DataFrame, columns=CATEGORICAL_COLUMNS) -> pd.DataFrame:
+    """
+    Convert the listed string columns present in df to category dtype.
+    """
+    converted = {c: df[c].astype("category") for c in columns
+                 if c in df and not isinstance(df[c].dtype, pd.CategoricalDtype)
+                 and (df[c].dtype == object or pd.api.types.is_string_dtype(df[c]))}
+    return df.assign(**converted) if converted else df
+
+
+def write_artifact(df: pd.DataFrame, name, partition_cols=None, store_dir=DEFAULT_STORE_DIR) -> str:
+    """
+    Write df as the artifact name and return its directory.
+
+    Unpartitioned artifacts are replaced whole. Partitioned ones only replace
+    the partitions present in df, so writing one brand's products leaves the
+    other brands in place.
+    """
+    path = artifact_path(name, store_dir)
+    partition_cols = PARTITIONS.get(name) if partition_cols is None else partition_cols
+    partition_cols = [c for c in (partition_cols or []) if c in df]
+    table = pa.Table.from_pandas(to_categorical(df), preserve_index=False)
+
+    if partition_cols:
+        pq.write_to_dataset(table, path, partition_cols=partition_cols,
+                            existing_data_behavior="delete_matching",
+                            basename_template="part-{i}.parquet", row_group_size=ROW_GROUP_SIZE)
+    else:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+        pq.write_table(table, os.path.join(path, "part-0.parquet"), row_group_size=ROW_GROUP_SIZE)
+    return path
+
+
+def artifact_exists(name, store_dir=DEFAULT_STORE_DIR) -> bool:
+    return os.path.isdir(artifact_path(name, store_dir))
+
+
+def _list_types(arrow_type):
+    # List columns (attribute_codes / attribute_scores) stay Arrow-backed;
+    # pandas cannot rebuild them from its own metadata
+    return pd.ArrowDtype(arrow_type) if pa.types.is_list(arrow_type) else None
+
+
+def read_parquet(path, columns=None, filters=None) -> pd.DataFrame:
+    """
+    Read a Parquet file or dataset directory with projection and filters.
+    """
+    return pq.read_table(path, columns=columns, filters=filters).to_pandas(types_mapper=_list_types)
+
+
+def read_artifact(name, columns=None, filters=None, store_dir=DEFAULT_STORE_DIR) -> pd.DataFrame:
+    """
+    Read the artifact name, loading only columns (all by default) and only
+    the partitions and row groups that can satisfy filters.
+    """
+    path = artifact_path(name, store_dir)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No artifact {name!r} in {store_dir}")
+    return read_parquet(path, columns=columns, filters=filters)
+
+
+def artifact_columns(name, store_dir=DEFAULT_STORE_DIR) -> list:
+    """
+    Column names of an artifact, read from the Parquet footers only.
+    """
+    import pyarrow.dataset as ds
+    return ds.dataset(artifact_path(name, store_dir), format="parquet", partitioning="hive").schema.names
+
+
+def write_scraped(results: dict, store_dir=DEFAULT_STORE_DIR) -> str:
+    """
+    Store scrape_all_sources output ({brand: DataFrame}) as the products
+    artifact, replacing only the brands that were scraped.
+    """
+    frames = [df.assign(brand=brand) for brand, df in results.items() if not df.empty]
+    if not frames:
+        return artifact_path("products", store_dir)
+    return write_artifact(pd.concat(frames, ignore_index=True), "products", store_dir=store_dir)
@@ -0,0 +1,38 @@
+import numpy as np
+from PIL import Image
+import attribute_extractor
+from attribute_scores import LABELS
+
+
+def test_clip_mode_keeps_caption_column(monkeypatch):
+    def fake_clip_scores(images, processor, model):
+        scores = np.zeros((len(images), len(LABELS)), dtype=np.float32)
+        scores[:, 0] = 1.0
+        return scores
+
+    monkeypatch.setattr(attribute_extractor, "clip_scores", fake_clip_scores)
+    monkeypatch.setattr(attribute_extractor, "get_clip", lambda profile=None: (None, None))
+    images = [Image.new("RGB", (32, 32), "red"), Image.new("RGB", (32, 32), "blue")]
+    df = attribute_extractor.enrich_attributes_from_images(images, names=["a.jpg", "b.jpg"], mode="clip",
+                                                           use_cache=False)
+    assert list(df["image_path"]) == ["a.jpg", "b.jpg"]
+    assert "caption" in df and df["caption"].isna().all()
+    assert [list(codes) for codes in df["attribute_codes"]] == [[0], [0]]
+
+
+def test_embed_images_to_store_appends_repeats_once(monkeypatch, tmp_path):
+    from embedding_store import EmbeddingStore
+
+    def fake_embed_images(images, processor, model):
+        return np.stack([np.asarray(image.resize((1, 1)), dtype=np.float32).ravel() for image in images])
+
+    monkeypatch.setattr(attribute_extractor, "embed_images", fake_embed_images)
+    monkeypatch.setattr(attribute_extractor, "get_clip", lambda profile=None: (None, None))
+    store = EmbeddingStore(str(tmp_path / "embeddings"), dim=3)
+    red, blue = Image.new("RGB", (8, 8), "red"), Image.new("RGB", (8, 8), "blue")
+
+    rows = attribute_extractor.embed_images_to_store([red, blue, red.copy()], store=store)
+    assert len(store) == 2
+    assert rows[0] == rows[2] and rows[0] != rows[1]
+    again = attribute_extractor.embed_images_to_store([blue, red], store=store)
+    assert len(store) == 2 and list(again) == [rows[1], rows[0]]
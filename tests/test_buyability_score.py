@@ -0,0 +1,12 @@
+import numpy as np
+import pandas as pd
+from buyability_score import compute_buyability_scores
+from nn_index import build_text_index
+
+
+def test_prebuilt_text_index_reference_without_text_model():
+    new = pd.DataFrame({"design_description": ["red silk midi dress", "blue denim jacket"]})
+    past = pd.DataFrame({"design_description": ["red silk maxi dress", "green wool coat", "black leather boots"]})
+    scored = compute_buyability_scores(new, build_text_index(past["design_description"]), past)
+    assert len(scored) == 2
+    assert np.isfinite(scored["buyability_score"]).all()
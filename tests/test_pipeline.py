@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+import pipeline
+import storage
+
+
+def _write_inputs(tmp_path):
+    candidates = pd.DataFrame({
+        "image_path": ["a.jpg", "b.jpg", "c.jpg"],
+        "Color": ["Red", "Blue", "Unknown"],
+        "Material": ["Silk", "Cotton", "Denim"],
+        "Style": ["Elegant", "Casual", "Casual"],
+    })
+    competitors = pd.DataFrame({
+        "name": ["x", "y"],
+        "color": ["red", "green"],
+        "material": ["silk", "wool"],
+        "style": ["elegant", "casual"],
+    })
+    candidates.to_csv(tmp_path / "candidates.csv", index=False)
+    competitors.to_csv(tmp_path / "competitors.csv", index=False)
+
+
+def test_scores_without_past_assortment(tmp_path):
+    _write_inputs(tmp_path)
+    workdir = tmp_path / "run"
+    pipeline.main(["--workdir", str(workdir), "--candidates", str(tmp_path / "candidates.csv"),
+                   "--competitors", str(tmp_path / "competitors.csv"), "--top-n", "2"])
+
+    scored = storage.read_artifact("score", store_dir=str(workdir))
+    assert np.isfinite(scored["buyability_score"]).all()
+    assert (scored["score_newness_brand"] == 0.5).all()
+    assert len(storage.read_artifact("recommend", store_dir=str(workdir))) == 2
+
+
+def test_stage_without_upstream_checkpoint_fails(tmp_path):
+    with pytest.raises(SystemExit, match="extract checkpoint"):
+        pipeline.main(["--workdir", str(tmp_path / "run"), "--stages", "score"])
+    with pytest.raises(SystemExit, match="score checkpoint"):
+        pipeline.main(["--workdir", str(tmp_path / "run"), "--stages", "recommend"])
+
+
+def test_resume_needs_explicit_workdir():
+    with pytest.raises(SystemExit, match="--workdir"):
+        pipeline.main(["--resume", "--stages", "recommend"])
+
+
+def test_later_stage_reuses_checkpoints(tmp_path):
+    _write_inputs(tmp_path)
+    workdir = str(tmp_path / "run")
+    pipeline.main(["--workdir", workdir, "--candidates", str(tmp_path / "candidates.csv"),
+                   "--competitors", str(tmp_path / "competitors.csv"), "--stages", "scrape,extract,score"])
+    pipeline.main(["--workdir", workdir, "--resume", "--stages", "recommend", "--top-n", "1"])
+    assert len(storage.read_artifact("recommend", store_dir=workdir)) == 1
@@ -0,0 +1,79 @@
+import os
+import pandas as pd
+import pytest
+from scraper import BRAND_ADAPTERS, listing_frame, parse_listing_html, parse_price
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "listings")
+
+# brand -> (fixture, page URL, expected rows of name, url, image_url, price)
+EXPECTED = {
+    "Zara": ("zara.html", "https://www.zara.com/ae/en/woman-dresses-l1066.html", [
+        ("SATIN MIDI DRESS", "https://www.zara.com/ae/en/satin-midi-dress-p02731123.html",
+         "https://static.zara.net/photos/2024/I/0/1/p/2731/123/800/2/w/563/2731123800_1_1_1.jpg", None),
+        ("FLORAL PRINT DRESS", "https://www.zara.com/ae/en/floral-print-dress-p04387044.html",
+         "https://static.zara.net/photos/2024/I/0/1/p/4387/044/330/2/w/563/4387044330_1_1_1.jpg", 1199.0),
+        ("KNIT DRESS", "https://www.zara.com/ae/en/knit-dress-p05536155.html",
+         "https://static.zara.net/photos/2024/I/0/1/p/5536/155/712/2/w/563/5536155712_1_1_1.jpg", None),
+    ]),
+    "H&M": ("hm.html", "https://ae.hm.com/en/shop-women/shop-by-product/dresses/", [
+        ("Ribbed bodycon dress", "https://ae.hm.com/en/buy-ribbed-bodycon-dress-black.html",
+         "https://image.hm.com/assets/hm/2a/4f/2a4f1.jpg", 79.0),
+        ("Linen-blend shirt dress", "https://ae.hm.com/en/buy-linen-blend-shirt-dress-beige.html",
+         "https://image.hm.com/assets/hm/7c/11/7c111.jpg", 149.0),
+    ]),
+    "Shein": ("shein.html", "https://ar.shein.com/Women-Dresses-c-1727.html", [
+        ("SHEIN Floral Print Ruffle Hem Dress", "https://ar.shein.com/Floral-Print-Ruffle-Hem-Dress-p-18765432.html",
+         "https://img.ltwebstatic.com/images3_pi/2024/03/18765432.jpg", 12.49),
+        ("SHEIN Solid Wrap Satin Dress", "https://ar.shein.com/Solid-Wrap-Satin-Dress-p-19876543.html",
+         "https://img.ltwebstatic.com/images3_pi/2024/04/19876543.jpg", 18.0),
+    ]),
+    "MaxFashion": ("maxfashion.html", "https://www.maxfashion.com/ae/en/c/women-dresses", [
+        ("Printed A-line Dress", "https://www.maxfashion.com/ae/en/buy-printed-a-line-dress/p/1000123",
+         "https://media.maxfashion.com/i/max/1000123_01.jpg", 69.0),
+        ("Tiered Maxi Dress", "https://www.maxfashion.com/ae/en/buy-tiered-maxi-dress/p/1000456",
+         "https://media.maxfashion.com/i/max/1000456_01.jpg", 89.0),
+    ]),
+    "Splash": ("splash.html", "https://www.splashfashions.com/ae/en/women/dresses", [
+        ("Striped Shirt Dress", "https://www.splashfashions.com/ae/en/women/dresses/164879871.html",
+         "https://www.splashfashions.com/dw/image/v2/164879871_1.jpg", 99.0),
+        ("Pleated Midi Dress", "https://www.splashfashions.com/ae/en/women/dresses/164880112.html",
+         "https://www.splashfashions.com/dw/image/v2/164880112_1.jpg", 129.0),
+    ]),
+}
+
+
+def test_every_adapter_has_a_fixture():
+    assert set(EXPECTED) == set(BRAND_ADAPTERS)
+
+
+@pytest.mark.parametrize("brand", sorted(EXPECTED))
+def test_parse_listing_fixture(brand):
+    fixture, page_url, expected = EXPECTED[brand]
+    adapter = BRAND_ADAPTERS[brand]
+    with open(os.path.join(FIXTURES, fixture), encoding="utf-8") as f:
+        items = parse_listing_html(f.read(), adapter, base_url=page_url)
+    df = listing_frame(items, adapter)
+
+    assert list(df.columns) == ["name", "url", "image_url", "price", "brand"]
+    assert (df["brand"] == brand).all()
+    rows = [(r.name, r.url, r.image_url, None if pd.isna(r.price) else r.price) for r in df.itertuples()]
+    assert rows == expected
+
+
+def test_json_ld_fallback_reads_price():
+    html = """<html><body><script type="application/ld+json">
+    {"@type": "ItemList", "itemListElement": [{"item": {"name": "Wrap Dress", "url": "/p/1",
+     "image": ["/img/1.jpg"], "offers": {"price": "59.90", "priceCurrency": "AED"}}}]}
+    </script></body></html>"""
+    adapter = BRAND_ADAPTERS["Splash"]
+    df = listing_frame(parse_listing_html(html, adapter, base_url="https://www.splashfashions.com/ae/"), adapter)
+    assert df.loc[0, "name"] == "Wrap Dress"
+    assert df.loc[0, "url"] == "https://www.splashfashions.com/p/1"
+    assert df.loc[0, "price"] == 59.9
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("AED 1,299.00", 1299.0), ("129,90 €", 129.9), ("1.299,00 EUR", 1299.0), ("$45", 45.0), ("Sold out", None),
+])
+def test_parse_price(text, expected):
+    assert parse_price(text) == expected
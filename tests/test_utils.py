@@ -0,0 +1,16 @@
+import os
+import time
+import utils
+
+
+def test_prune_workspaces_removes_only_stale_sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "TEMP_ROOT", str(tmp_path))
+    for session in ("stale", "fresh", "current"):
+        with open(os.path.join(utils.session_workspace(session), "upload.png"), "wb") as f:
+            f.write(b"png")
+    old = time.time() - 2 * utils.WORKSPACE_TTL
+    for session in ("stale", "current"):
+        os.utime(tmp_path / session, (old, old))
+
+    assert utils.prune_workspaces(keep="current") == ["stale"]
+    assert sorted(os.listdir(tmp_path)) == ["current", "fresh"]
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import joblib
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from nn_index import TextIndex
+
+DEFAULT_CACHE_DIR = os.path.join(".pickwise_cache", "text_features")
+
+
+def corpus_fingerprint(*corpora) -> str:
+    """
+    Stable hash of one or more sequences of descriptions.
+    """
+    digest = hashlib.sha256()
+    for corpus in corpora:
+        for text in corpus:
+            digest.update(str(text).encode())
+            digest.update(b"\x1f")
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+class TextFeatureModel:
+    """
+    TF-IDF model fitted once on the reference corpus (past brand + competitors).
+
+    New candidates are only transformed. Reference matrices are cached in
+    memory and as .npz files under cache_dir, keyed by model and corpus, so
+    re-scoring against an unchanged market skips vectorizing it again.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.vectorizer = None
+        self.fingerprint = None
+        self._matrices = {}
+        self._indexes = {}
+
+    def fit(self, *reference_corpora):
+        texts = [str(text) for corpus in reference_corpora for text in corpus]
+        self.vectorizer = TfidfVectorizer().fit(texts)
+        self.fingerprint = corpus_fingerprint(*reference_corpora)
+        self._matrices, self._indexes = {}, {}
+        return self
+
+    def transform(self, descriptions):
+        return self.vectorizer.transform([str(d) for d in descriptions])
+
+    def reference_matrix(self, descriptions):
+        """
+        TF-IDF matrix of a reference set, served from cache when unchanged.
+        """
+        key = corpus_fingerprint([self.fingerprint], descriptions)
+        if key in self._matrices:
+            return self._matrices[key]
+
+        path = os.path.join(self.cache_dir, f"{key}.npz") if self.cache_dir else None
+        if path and os.path.exists(path):
+            matrix = sp.load_npz(path)
+        else:
+            matrix = self.transform(descriptions).tocsr()
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                sp.save_npz(path, matrix)
+        self._matrices[key] = matrix
+        return matrix
+
+    def reference_index(self, descriptions, backend="exact", **backend_kwargs) -> TextIndex:
+        """
+        Nearest-neighbour index over a reference set, sharing this vectorizer.
+        """
+        key = (corpus_fingerprint([self.fingerprint], descriptions), backend)
+        if key not in self._indexes:
+            index = TextIndex(backend=backend, vectorizer=self.vectorizer, **backend_kwargs)
+            self._indexes[key] = index.build(self.reference_matrix(descriptions))
+        return self._indexes[key]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump({"vectorizer": self.vectorizer, "fingerprint": self.fingerprint}, path)
+        return path
+
+    @classmethod
+    def load(cls, path, cache_dir=DEFAULT_CACHE_DIR):
+        state = joblib.load(path)
+        model = cls(cache_dir=cache_dir)
+        model.vectorizer = state["vectorizer"]
+        model.fingerprint = state["fingerprint"]
+        return model
+
+
+def load_or_fit_text_model(*reference_corpora, path=os.path.join(DEFAULT_CACHE_DIR, "model.joblib"),
+                           cache_dir=DEFAULT_CACHE_DIR) -> TextFeatureModel:
+    """
+    Load the saved model if it was fitted on the same reference corpus,
+    otherwise fit a new one and save it.
+    """
+    fingerprint = corpus_fingerprint(*reference_corpora)
+    if os.path.exists(path):
+        model = TextFeatureModel.load(path, cache_dir=cache_dir)
+        if model.fingerprint == fingerprint:
+            return model
+    model = TextFeatureModel(cache_dir=cache_dir).fit(*reference_corpora)
+    model.save(path)
+    return model
@@ -1,40 +1,128 @@
+import hashlib
 import tempfile
 import os
 import shutil
+import time
 import uuid
 from datetime import datetime
 from PIL import Image
 
 
-def load_uploaded_images(file_list):
+# Uploads are streamed to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+TEMP_ROOT = "temp_images"
+DEFAULT_SESSION = "default"
+# Model resolution (BLIP Large); the same thumbnail feeds the extractor and the gallery
+THUMBNAIL_SIZE = (384, 384)
+# Workspaces untouched for this long belong to ended sessions
+WORKSPACE_TTL = 24 * 60 * 60
+
+
+def session_workspace(session_id=None):
     """
-    Saves uploaded Streamlit files to temp storage and returns metadata list.
+    Per-session upload directory, so sessions never see or clear each other's files.
     """
-    image_data = []
-    os.makedirs("temp_images", exist_ok=True)
+    path = os.path.join(TEMP_ROOT, session_id or DEFAULT_SESSION)
+    os.makedirs(path, exist_ok=True)
+    # Mark it as in use for prune_workspaces
+    os.utime(path)
+    return path
 
-    for file in file_list:
-        ext = os.path.splitext(file.name)[1]
-        unique_name = f"{uuid.uuid4().hex}{ext}"
-        temp_path = os.path.join("temp_images", unique_name)
 
-        with open(temp_path, "wb") as f:
-            f.write(file.read())
+def prune_workspaces(max_age=WORKSPACE_TTL, keep=()):
+    """
+    Delete session workspaces not used for max_age seconds, except those in
+    keep. Streamlit has no session-end hook, so the app calls this whenever
+    a new session starts. Returns the removed session ids.
+    """
+    if not os.path.isdir(TEMP_ROOT):
+        return []
+    keep = {keep} if isinstance(keep, str) else set(keep)
+    cutoff = time.time() - max_age
+    removed = []
+    for entry in os.scandir(TEMP_ROOT):
+        if entry.is_dir() and entry.name not in keep and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed.append(entry.name)
+    return removed
+
+
+def _stream_to_workspace(file, workspace):
+    # Copy the upload in chunks while hashing it, then name it by its content
+    if hasattr(file, "seek"):
+        file.seek(0)
+    digest = hashlib.sha256()
+    partial = os.path.join(workspace, f".{uuid.uuid4().hex}.part")
+    with open(partial, "wb") as f:
+        for chunk in iter(lambda: file.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            f.write(chunk)
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+    content_hash = digest.hexdigest()
+    ext = os.path.splitext(file.name)[1].lower()
+    path = os.path.join(workspace, f"{content_hash}{ext}")
+    if os.path.exists(path):
+        os.remove(partial)
+        return path, content_hash, True
+    os.replace(partial, path)
+    return path, content_hash, False
+
+
+def thumbnail_path(image_path, size=THUMBNAIL_SIZE):
+    folder = os.path.join(os.path.dirname(image_path), "thumbs")
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(folder, f"{name}_fit{size[0]}x{size[1]}.png")
+
+
+def get_thumbnail(image_path, size=THUMBNAIL_SIZE):
+    """
+    Path of the cached thumbnail of image_path, created with resize_image on
+    first use. Thumbnails keep the aspect ratio so the models still see the
+    original framing (CLIP center-crops it itself). Uploads are content-named,
+    so a cached thumbnail never goes stale.
+    """
+    path = thumbnail_path(image_path, size)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if resize_image(image_path, path, size, keep_aspect=True) is None:
+            return None
+    return path
+
+
+def load_uploaded_images(file_list, session_id=None, thumbnails=True):
+    """
+    Stream uploaded Streamlit files into the session workspace and return a
+    metadata list, one entry per upload.
+
+    Files are named by the SHA-256 of their bytes, so re-uploads and duplicate
+    files are stored once (is_duplicate marks entries whose content was already
+    there). thumbnail_path points at the model-resolution copy the extractor
+    and the gallery should read instead of the original.
+    """
+    image_data = []
+    workspace = session_workspace(session_id)
 
+    for file in file_list:
+        path, content_hash, duplicate = _stream_to_workspace(file, workspace)
         image_data.append({
-            "image_path": temp_path,
+            "image_path": path,
             "image_name": file.name,
+            "content_hash": content_hash,
+            "is_duplicate": duplicate,
+            "thumbnail_path": get_thumbnail(path) if thumbnails else None,
             "upload_time": datetime.now().isoformat()
         })
 
     return image_data
 
 
-def clear_temp_images():
+def clear_temp_images(session_id=None):
     """
-    Deletes all temp images from temp_images folder.
+    Deletes the temp images (and thumbnails) of one session's workspace.
     """
-    temp_dir = "temp_images"
+    temp_dir = os.path.join(TEMP_ROOT, session_id or DEFAULT_SESSION)
     if os.path.exists(temp_dir):
         shutil.rmtree(temp_dir)
         os.makedirs(temp_dir)
@@ -47,9 +135,19 @@ def format_score(score):
     return f"{score:.2f}"
 
 
+def save_dataframe(df, filename_prefix="output", partition_cols=None):
+    """
+    Save a DataFrame as a timestamped Parquet artifact in the output store.
+    """
+    from storage import write_artifact
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return write_artifact(df, f"{filename_prefix}_{timestamp}", partition_cols=partition_cols)
+
+
 def save_dataframe_csv(df, filename_prefix="output"):
     """
-    Save a DataFrame to output folder with timestamped filename.
+    Export a DataFrame as a timestamped CSV in the output folder, for
+    spreadsheets; pipeline artifacts go through save_dataframe.
     """
     os.makedirs("output", exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -58,13 +156,19 @@ def save_dataframe_csv(df, filename_prefix="output"):
     return path
 
 
-def resize_image(input_path, output_path=None, size=(300, 300)):
+def resize_image(input_path, output_path=None, size=(300, 300), keep_aspect=False):
     """
     Resize an image to a given size. Saves resized copy if output_path is provided.
+    With keep_aspect the image is only shrunk to fit inside size, never stretched.
     """
     try:
         img = Image.open(input_path)
-        img = img.resize(size)
+        # Let JPEGs decode at a reduced scale instead of full size
+        img.draft("RGB", size)
+        if keep_aspect:
+            img.thumbnail(size)
+        else:
+            img = img.resize(size)
         if output_path:
             img.save(output_path)
         return img